@@ -4,10 +4,13 @@ import time
 import numpy as np
 import cv2
 import os
+from concurrent.futures import ThreadPoolExecutor
 from werkzeug.utils import secure_filename
 from config import config
 from models.face_matcher import AdvancedFaceMatcher
 from models.cctv_manager import CCTVManager
+from utils.helpers import OrjsonProvider, ORJSON_AVAILABLE
+from utils.cache import cache, PERSON_LIST_KEY, DASHBOARD_KEY
 
 # Import routes
 from routes.person_routes import person_bp, init_person_routes
@@ -29,17 +32,30 @@ logger = logging.getLogger(__name__)
 def create_app(config_name='default'):
     """Application factory pattern"""
     app = Flask(__name__)
+    if ORJSON_AVAILABLE:
+        app.json = OrjsonProvider(app)
     app_config = config[config_name]()
     app_config.init_app(app)
+    cache.init_app(app, config={
+        'CACHE_TYPE': getattr(app_config, 'CACHE_TYPE', 'SimpleCache'),
+        'CACHE_DEFAULT_TIMEOUT': getattr(app_config, 'CACHE_DEFAULT_TIMEOUT', 5),
+    })
     
     # Initialize components
     try:
         # MANUAL WORK: These might take time to download models on first run
-        logger.info("Initializing Face Matcher...")
-        face_matcher = AdvancedFaceMatcher()
-        
-        logger.info("Initializing CCTV Manager...")
-        cctv_manager = CCTVManager(app_config)
+        # Model loading and RTSP probing are independent, so run them concurrently
+        logger.info("Initializing Face Matcher and CCTV Manager...")
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            face_matcher_future = executor.submit(
+                AdvancedFaceMatcher,
+                model_name=getattr(app_config, 'INSIGHTFACE_MODEL', 'buffalo_l'),
+                det_size=getattr(app_config, 'INSIGHTFACE_DET_SIZE', (640, 640)),
+                intra_op_threads=getattr(app_config, 'ONNX_INTRA_OP_THREADS', 0)
+            )
+            cctv_manager_future = executor.submit(CCTVManager, app_config)
+            face_matcher = face_matcher_future.result()
+            cctv_manager = cctv_manager_future.result()
         app_config.face_matcher = face_matcher
         
         # Reload lost persons database now that face_matcher is available
@@ -87,23 +103,24 @@ def create_app(config_name='default'):
     def add_webcam_for_testing():
         """Add webcam stream for face detection testing"""
         try:
-            # Test if webcam is available
-            import cv2
-            cap = cv2.VideoCapture(0)
+            # Test if webcam is available; the opened capture is handed over to the
+            # monitor thread so the device is not re-opened
+            cap = cctv_manager.open_capture("0")
             if cap.isOpened():
                 ret, frame = cap.read()
-                cap.release()
                 if ret and frame is not None:
                     logger.info("Webcam is available, adding webcam stream")
-                    success = cctv_manager.add_webcam_stream("Live Webcam", "Your Location")
+                    success = cctv_manager.add_webcam_stream("Live Webcam", "Your Location", cap=cap)
                     if success:
                         logger.info("Webcam stream added successfully")
                         return True
                     else:
                         logger.error("Failed to add webcam stream")
                 else:
+                    cap.release()
                     logger.warning("Webcam opened but cannot read frames")
             else:
+                cap.release()
                 logger.warning("Webcam not available")
         except Exception as e:
             logger.error(f"Error testing webcam: {e}")
@@ -133,15 +150,20 @@ def create_app(config_name='default'):
     
     @app.route('/api/cctv/stream/<name>')
     def video_feed(name):
-        """Continuous MJPEG streaming for real-time video"""
+        """Continuous MJPEG streaming for real-time video, pushed as frames are produced"""
+        if name not in cctv_manager.active_streams:
+            abort(404)
+        
         def generate():
+            last_ts = None
             while True:
                 try:
-                    frame = cctv_manager.get_current_frame(name)
-                    if frame:
-                        yield (b'--frame\r\n'
-                               b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
-                    time.sleep(0.04)  # ~25 FPS for smooth streaming
+                    # Wakes as soon as the monitor thread publishes a new frame
+                    frame, last_ts = cctv_manager.wait_for_frame(name, last_ts)
+                    if frame is None:
+                        break  # stream was removed
+                    yield (b'--frame\r\n'
+                           b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
                 except Exception as e:
                     logger.error(f"Error generating MJPEG stream for {name}: {e}")
                     # Return a placeholder frame on error
@@ -195,6 +217,8 @@ def create_app(config_name='default'):
             logger.info(f"add_lost_person returned: {success}")
             
             if success:
+                # The person was also saved to the persons DB shown by these views
+                cache.delete_many(PERSON_LIST_KEY, DASHBOARD_KEY)
                 return jsonify({
                     'success': True,
                     'message': f'Lost person {name} added successfully',
@@ -15,7 +15,12 @@ class Config:
     
     # CCTV Config
     RTSP_TIMEOUT = 10
+    RTSP_CONNECT_TIMEOUT = 2  # seconds for the TCP reachability check before opening a stream
     FRAME_CAPTURE_INTERVAL = 2  # seconds
+    JPEG_QUALITY = 75  # quality of frames served to the dashboard
+    STREAM_PREVIEW_SIZE = None  # e.g. (320, 240) to serve smaller previews
+    STREAM_FPS = 25  # frames per second decoded and processed per stream
+    STREAM_DECODER = 'opencv'  # or 'ffmpeg' to decode network streams in an ffmpeg subprocess
     
     # Database Config
     DATABASE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'database')
@@ -25,6 +30,14 @@ class Config:
     
     # Model Config
     INSIGHTFACE_MODEL = 'buffalo_l'
+    INSIGHTFACE_DET_SIZE = (640, 640)
+    DETECTION_FPS = 5  # detection passes per second for streams whose results are being polled
+    DETECTION_IDLE_SECONDS = 30  # stop a stream's detection worker after this long without requests
+    ONNX_INTRA_OP_THREADS = 0  # threads per inference call; 0 = ONNX Runtime default
+    
+    # View cache Config (used when Flask-Caching is installed)
+    CACHE_TYPE = 'SimpleCache'
+    CACHE_DEFAULT_TIMEOUT = 5  # seconds the dashboard/list pages are served from cache
     
     @staticmethod
     def init_app(app):
@@ -4,27 +4,334 @@ import time
 import logging
 import json
 import base64
-import cv2
 import numpy as np
-import time
 import os
+import shutil
+import socket
+import atexit
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from queue import Queue
+from urllib.parse import urlsplit
+
+# Low-latency FFmpeg options for network streams (read by OpenCV whenever an FFmpeg
+# capture is opened): TCP transport, no demuxer buffering
+os.environ.setdefault('OPENCV_FFMPEG_CAPTURE_OPTIONS',
+                      'rtsp_transport;tcp|fflags;nobuffer|flags;low_delay')
+
+# Try to import optional GPU JPEG encoder (CUDA tensors need torchvision >= 0.19);
+# broken torch/CUDA installs can raise more than ImportError here
+try:
+    import torch
+    from torchvision.io import encode_jpeg
+    TORCH_JPEG_AVAILABLE = torch.cuda.is_available()
+except Exception:
+    TORCH_JPEG_AVAILABLE = False
+
+# Try to import optional libjpeg-turbo binding (encodes straight to bytes)
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR, TJSAMP_420
+    TURBOJPEG_AVAILABLE = True
+except ImportError:
+    TURBOJPEG_AVAILABLE = False
+
+# Try to import optional SIMD base64 encoder
+try:
+    import pybase64
+    PYBASE64_AVAILABLE = True
+except ImportError:
+    PYBASE64_AVAILABLE = False
+
+# ffmpeg binary for the optional subprocess decoder (STREAM_DECODER = 'ffmpeg')
+FFMPEG_BINARY = shutil.which('ffmpeg')
+
+# Check for optional GPU video decoding (OpenCV built with CUDA + NVCUVID)
+try:
+    CUDA_CODEC_AVAILABLE = hasattr(cv2, 'cudacodec') and cv2.cuda.getCudaEnabledDeviceCount() > 0
+except Exception:
+    CUDA_CODEC_AVAILABLE = False
 
 logger = logging.getLogger(__name__)
 
+_timestamp_cache = {'second': None, 'text': ''}
+
+def _timestamp_str():
+    """Current local time as 'YYYY-mm-dd HH:MM:SS', formatted at most once per second"""
+    second = int(time.time())
+    if second != _timestamp_cache['second']:
+        _timestamp_cache['text'] = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(second))
+        _timestamp_cache['second'] = second
+    return _timestamp_cache['text']
+
+DEFAULT_PORTS = {'rtsp': 554, 'rtsps': 322, 'http': 80, 'https': 443, 'rtmp': 1935}
+
+def is_host_reachable(url, timeout):
+    """TCP-connect to the camera's host/port; URLs without a host (files) pass"""
+    try:
+        parts = urlsplit(url)
+        port = parts.port or DEFAULT_PORTS.get(parts.scheme.lower())
+    except ValueError:
+        return False
+    if not parts.hostname or port is None:
+        return True
+    try:
+        with socket.create_connection((parts.hostname, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+FRAME_SIZE = (640, 480)  # (width, height) every stream is normalized to
+
+def fit_frame(frame):
+    """Resize a BGR frame to FRAME_SIZE, skipping the copy when it already matches"""
+    h, w = frame.shape[:2]
+    if (w, h) == FRAME_SIZE:
+        return frame
+    interpolation = cv2.INTER_AREA if w > FRAME_SIZE[0] else cv2.INTER_LINEAR
+    return cv2.resize(frame, FRAME_SIZE, interpolation=interpolation)
+
+# A grab() that returns faster than this was served from the driver/demuxer queue
+# rather than waiting for the camera, so a newer frame is already behind it
+_QUEUED_GRAB_SECONDS = 0.004
+
+def read_latest(cap, next_due, max_drain=30):
+    """Read the newest frame from `cap`, decoding only that one.
+
+    grab() is called (without retrieving) until `next_due` has passed and the queue
+    of frames that piled up while we were busy is drained; only then is the frame
+    retrieved. Returns None when the capture fails.
+    """
+    for _ in range(max_drain):
+        started = time.monotonic()
+        if not cap.grab():
+            return None
+        now = time.monotonic()
+        if now >= next_due and now - started > _QUEUED_GRAB_SECONDS:
+            break
+    ok, frame = cap.retrieve()
+    return frame if ok else None
+
+def frame_dhash(frame):
+    """64-bit difference hash of a BGR frame: near-identical frames hash alike"""
+    small = cv2.resize(frame, (9, 8), interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    return int.from_bytes(np.packbits(gray[:, 1:] > gray[:, :-1]).tobytes(), 'big')
+
+def hamming_distance(hash1, hash2):
+    """Number of differing bits between two hashes"""
+    return bin(hash1 ^ hash2).count('1')
+
+class NetworkStreamReader:
+    """Reads FRAME_SIZE BGR frames from an RTSP/HTTP camera.
+
+    With a CUDA-enabled OpenCV build, decoding (NVDEC), colour conversion and the
+    resize all run on the GPU and only the small frame is copied to host memory.
+    With `use_ffmpeg` an ffmpeg subprocess decodes and scales the stream and pipes
+    raw BGR frames, keeping decoding out of this process entirely. Otherwise frames
+    come from an OpenCV FFmpeg capture and are resized on the CPU.
+    """
+
+    def __init__(self, url, open_capture, use_ffmpeg=False, fps=25, timeout=10, cap=None):
+        """`cap` is an already-opened OpenCV capture of `url` to read from, saving a
+        second connection handshake; it is released if another decoder is used"""
+        self._gpu_reader = None
+        self._cap = None
+        self._proc = None
+        if use_ffmpeg and not FFMPEG_BINARY:
+            logger.warning("ffmpeg not found on PATH, decoding with OpenCV instead")
+        if use_ffmpeg and FFMPEG_BINARY:
+            self._proc = self._start_ffmpeg(url, fps, timeout)
+        elif CUDA_CODEC_AVAILABLE:
+            try:
+                self._gpu_reader = cv2.cudacodec.createVideoReader(url)
+            except Exception as e:
+                logger.warning(f"GPU decoding unavailable for {url}, using FFmpeg: {e}")
+        if self._gpu_reader is None and self._proc is None:
+            self._cap = cap if cap is not None else open_capture(url)
+        elif cap is not None:
+            cap.release()
+
+    @staticmethod
+    def _start_ffmpeg(url, fps, timeout):
+        """Spawn ffmpeg writing FRAME_SIZE bgr24 frames at `fps` to its stdout"""
+        width, height = FRAME_SIZE
+        timeout_us = str(int(timeout * 1_000_000))
+        input_args = ['-fflags', 'nobuffer', '-flags', 'low_delay']
+        if url.lower().startswith('rtsp'):
+            input_args += ['-rtsp_transport', 'tcp', '-timeout', timeout_us]
+        else:
+            input_args += ['-rw_timeout', timeout_us]
+        return subprocess.Popen(
+            [FFMPEG_BINARY, '-nostdin', '-loglevel', 'error', *input_args, '-i', url,
+             '-an', '-vf', f'fps={fps},scale={width}:{height}',
+             '-f', 'rawvideo', '-pix_fmt', 'bgr24', 'pipe:1'],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=0
+        )
+
+    def _read_pipe(self):
+        """Read one raw frame from the ffmpeg pipe straight into a new array"""
+        width, height = FRAME_SIZE
+        frame = np.empty((height, width, 3), dtype=np.uint8)
+        view = memoryview(frame).cast('B')
+        filled = 0
+        while filled < len(view):
+            count = self._proc.stdout.readinto(view[filled:])
+            if not count:
+                return None  # ffmpeg exited (stream lost or timed out)
+            filled += count
+        return frame
+
+    def read(self, next_due=0.0):
+        """Return the newest frame once `next_due` (monotonic) has passed, or None if
+        the stream stalled or ended"""
+        if self._proc is not None:
+            # ffmpeg already paces output to the target FPS
+            return self._read_pipe()
+
+        if self._gpu_reader is not None:
+            ok, gpu_frame = self._gpu_reader.nextFrame()
+            if not ok:
+                return None
+            if gpu_frame.channels() == 4:
+                gpu_frame = cv2.cuda.cvtColor(gpu_frame, cv2.COLOR_BGRA2BGR)
+            if gpu_frame.size() != FRAME_SIZE:
+                gpu_frame = cv2.cuda.resize(gpu_frame, FRAME_SIZE, interpolation=cv2.INTER_AREA)
+            return gpu_frame.download()
+
+        frame = read_latest(self._cap, next_due)
+        if frame is None:
+            return None
+        return fit_frame(frame)
+
+    def release(self):
+        if self._cap is not None:
+            self._cap.release()
+        if self._proc is not None:
+            self._proc.kill()
+            self._proc.wait()
+        self._gpu_reader = None
+
+class LatestFrame:
+    """Single-slot mailbox holding the most recent frame of a stream.
+
+    The (frame, jpeg, timestamp) tuple is replaced by one attribute assignment, which
+    is atomic in CPython, so get() never sees a torn update and needs no lock.
+    Streaming viewers block in wait() and are woken when a new frame is published;
+    the producer only touches the condition's lock while someone is waiting.
+    """
+    __slots__ = ('_entry', '_cond', '_waiters')
+
+    def __init__(self):
+        self._entry = (None, None, None)
+        self._cond = threading.Condition()
+        self._waiters = 0
+
+    def put(self, frame, jpeg=None):
+        """Publish a new raw frame and its encoded JPEG, replacing any previous one"""
+        self._entry = (frame, jpeg, time.monotonic())
+        # A waiter registers before checking the entry, so either it sees the new
+        # frame or we see it here and wake it
+        if self._waiters:
+            with self._cond:
+                self._cond.notify_all()
+
+    def get(self):
+        """Return the latest (frame, jpeg, timestamp); all None before the first frame"""
+        return self._entry
+
+    def wait(self, after, timeout=None):
+        """Block until a frame newer than timestamp `after` is published (or timeout)
+        and return the latest (frame, jpeg, timestamp)"""
+        with self._cond:
+            self._waiters += 1
+            try:
+                self._cond.wait_for(lambda: self._entry[2] != after, timeout)
+            finally:
+                self._waiters -= 1
+            return self._entry
+
 class CCTVManager:
+    # Stream fields exposed by get_stream_status
+    STATUS_FIELDS = ('location', 'active', 'last_update', 'error_count', 'url')
+    # Of those, the fields maintained by the monitor thread of the stream's source
+    SOURCE_STATUS_FIELDS = ('active', 'last_update', 'error_count')
+    # Frames whose dHash differs by fewer bits than this reuse the previous detections,
+    # but detection still reruns at least this often (e.g. after new lost persons load)
+    UNCHANGED_FRAME_BITS = 5
+    DETECTION_REFRESH_SECONDS = 2.0
+    # Extra overlays stay drawn this long after newer faces are detected, while their
+    # producer catches up with the new pass
+    EXTRA_OVERLAY_GRACE_SECONDS = 1.0
+    # Frames are rendered and encoded until this long after the last frame request
+    VIEWER_IDLE_SECONDS = 2.0
+    
     def __init__(self, config):
         self.config = config
         self.active_streams = {}
-        self.frame_queues = {}
+        self.latest_frames = {}
+        self.frame_requests = {}
         self.stream_threads = {}
         self.running = False
         
+        # Guards adding/removing streams and starting their threads; per-frame
+        # reads and writes go through the lock-free LatestFrame slots instead
+        self._lock = threading.RLock()
+        
+        # JPEG encoding (GPU when CUDA + torchvision are available, then libjpeg-turbo,
+        # then OpenCV)
+        self.jpeg_quality = getattr(config, 'JPEG_QUALITY', 75)
+        self.preview_size = getattr(config, 'STREAM_PREVIEW_SIZE', None)
+        # Baseline (non-progressive, non-optimized Huffman) JPEG is the cheapest to encode
+        self._jpeg_params = [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality,
+                             cv2.IMWRITE_JPEG_OPTIMIZE, 0,
+                             cv2.IMWRITE_JPEG_PROGRESSIVE, 0]
+        self._gpu_jpeg = TORCH_JPEG_AVAILABLE
+        # Per-thread pinned host buffer for the upload, reused while the frame shape holds
+        self._pinned_frames = threading.local()
+        if self._gpu_jpeg:
+            logger.info("Using GPU JPEG encoder for stream frames")
+        self._turbojpeg = None
+        if TURBOJPEG_AVAILABLE:
+            try:
+                self._turbojpeg = TurboJPEG()
+            except Exception as e:
+                logger.warning(f"libjpeg-turbo not loadable, using OpenCV JPEG encoder: {e}")
+        
+        # Static part of the startup placeholder, drawn once
+        self._placeholder_template = np.zeros((480, 640, 3), dtype=np.uint8)
+        cv2.putText(self._placeholder_template, "Initializing Webcam...", (100, 240),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.9, (255, 255, 255), 2)
+        self._placeholder_cache = (None, None)  # (second, jpeg)
+        self._base64_cache = {}  # stream_name -> (jpeg, base64 str), encoded once per frame
+        
+        # Haar cascade for the overlay fallback, parsed once instead of per frame
+        self._face_cascade = None
+        cascade_path = os.path.join(cv2.data.haarcascades, "haarcascade_frontalface_default.xml")
+        if not os.path.exists(cascade_path):
+            logger.error(f"❌ Haarcascade not found at {cascade_path}")
+        else:
+            self._face_cascade = cv2.CascadeClassifier(cascade_path)
+        
         # Lost persons database
         self.lost_face_encodings = []
         self.lost_face_names = []
         self.lost_faces_dir = "data/lost_faces"
+        # (matrix, norms, names) used for per-frame matching; rebuilt when the lost
+        # persons change and swapped as one tuple so matrix rows and names always agree
+        self._lost_match_table = (np.zeros((0, 0), dtype=np.float32), np.zeros(0, dtype=np.float32), [])
+        
+        # Stream DB writes are coalesced by a background writer
+        self._save_requested = threading.Event()
+        threading.Thread(target=self._stream_db_writer, daemon=True).start()
+        # The writer is a daemon thread, so flush a pending save when the process exits
+        atexit.register(self._flush_streams_db)
+        
+        # The monitor thread owns detection, overlays and publishing. Faces it detects
+        # (with embeddings) are shared so other matchers don't run the detector again,
+        # and their results come back as overlay data drawn by _render_frame
+        self._detected_faces = {}  # stream_name -> (timestamp, [{'bbox', 'embedding'}])
+        self._extra_overlays = {}  # stream_name -> (faces timestamp, overlays)
         
         # Load existing streams from database
         self.load_streams_from_db()
@@ -80,11 +387,22 @@ class CCTVManager:
                 except Exception as e:
                     logger.error(f"❌ Error processing {image_file}: {e}")
             
+            self._rebuild_lost_match_table()
             logger.info(f"✅ Loaded {len(self.lost_face_names)} lost persons into database")
             
         except Exception as e:
             logger.error(f"❌ Error loading lost persons database: {e}")
     
+    def _rebuild_lost_match_table(self):
+        """Stack the lost persons' embeddings into the float32 matrix and row norms
+        used by detect_and_match_faces_realtime"""
+        names = list(self.lost_face_names)
+        if self.lost_face_encodings:
+            matrix = np.ascontiguousarray(self.lost_face_encodings, dtype=np.float32)
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+        self._lost_match_table = (matrix, np.linalg.norm(matrix, axis=1), names)
+    
     def reload_lost_persons_database(self):
         """Reload lost persons database after face_matcher is available"""
         try:
@@ -126,6 +444,7 @@ class CCTVManager:
                 except Exception as e:
                     logger.error(f"❌ Error processing {image_file}: {e}")
             
+            self._rebuild_lost_match_table()
             logger.info(f"✅ Reloaded {len(self.lost_face_names)} lost persons into database")
             return True
             
@@ -158,6 +477,7 @@ class CCTVManager:
                 if is_valid:
                     self.lost_face_encodings.append(embedding_data['insightface'])
                     self.lost_face_names.append(person_name)
+                    self._rebuild_lost_match_table()
                     
                     # Save to database
                     from utils.helpers import save_person_to_db
@@ -212,13 +532,26 @@ class CCTVManager:
                     return
                     
                 streams_data = json.loads(content)
+            
+            # Probe network streams in parallel so startup waits for one timeout, not N
+            network_urls = list({info['url'] for info in streams_data.values()
+                                 if info['url'] not in ["0", "demo"]})
+            reachable = {}
+            if network_urls:
+                with ThreadPoolExecutor(max_workers=min(8, len(network_urls))) as executor:
+                    reachable = dict(zip(network_urls, executor.map(self.test_rtsp_connection, network_urls)))
                     
             for stream_name, stream_info in streams_data.items():
+                if not reachable.get(stream_info['url'], True):
+                    logger.error(f"Failed to connect to RTSP stream: {stream_info['url']}")
+                    continue
                 self.add_stream(
                     stream_name,
                     stream_info['url'],
                     stream_info['location'],
-                    start_monitoring=False
+                    start_monitoring=False,
+                    test_connection=False,
+                    save=False
                 )
                 
             logger.info(f"Loaded {len(streams_data)} streams from database")
@@ -226,13 +559,33 @@ class CCTVManager:
             logger.error(f"Error loading CCTV database: {e}")
     
     def save_streams_to_db(self):
-        """Save CCTV streams to database file"""
+        """Schedule a save of CCTV streams; bursts of changes are written once"""
+        self._save_requested.set()
+    
+    def _stream_db_writer(self):
+        """Background writer: flush pending stream changes at most once per second"""
+        while True:
+            self._save_requested.wait()
+            self._save_requested.clear()
+            self._write_streams_db()
+            time.sleep(1.0)
+    
+    def _flush_streams_db(self):
+        """Write a pending stream DB change immediately"""
+        if self._save_requested.is_set():
+            self._save_requested.clear()
+            self._write_streams_db()
+    
+    def _write_streams_db(self):
+        """Write CCTV streams to database file"""
         try:
             if not hasattr(self.config, 'CCTV_DB_FILE'):
                 return
                 
             streams_data = {}
-            for stream_name, stream_info in self.active_streams.items():
+            with self._lock:
+                streams = list(self.active_streams.items())
+            for stream_name, stream_info in streams:
                 streams_data[stream_name] = {
                     'url': stream_info['url'],
                     'location': stream_info['location'],
@@ -246,69 +599,117 @@ class CCTVManager:
         except Exception as e:
             logger.error(f"Error saving CCTV database: {e}")
     
-    def add_stream(self, stream_name, rtsp_url, location, start_monitoring=True):
-        """Add a new RTSP stream"""
+    def add_stream(self, stream_name, rtsp_url, location, start_monitoring=True, test_connection=True,
+                   cap=None, save=True):
+        """Add a new RTSP stream; an already-opened `cap` is handed to the monitor thread"""
         logger.info(f"Attempting to add stream: {stream_name}")
         
         if stream_name in self.active_streams:
             logger.warning(f"Stream {stream_name} already exists")
             return False
         
-        # Test connection first (skip for webcam and demo)
-        if rtsp_url not in ["0", "demo"] and not self.test_rtsp_connection(rtsp_url):
-            logger.error(f"Failed to connect to RTSP stream: {rtsp_url}")
-            return False
-        
-        self.active_streams[stream_name] = {
-            'url': rtsp_url,
-            'location': location,
-            'active': True,
-            'last_frame': None,
-            'last_update': None,
-            'added_date': datetime.now().isoformat(),
-            'error_count': 0
-        }
-        
-        # Create frame queue for this stream
-        self.frame_queues[stream_name] = Queue(maxsize=1)
+        # Test connection first (skip for webcam and demo, or if the caller already did);
+        # the probe's open capture is handed to the monitor thread rather than reopened
+        if test_connection and rtsp_url not in ["0", "demo"] and cap is None:
+            cap = self.probe_capture(rtsp_url)
+            if cap is None:
+                logger.error(f"Failed to connect to RTSP stream: {rtsp_url}")
+                return False
         
-        if start_monitoring:
-            self.start_stream_monitoring(stream_name)
+        with self._lock:
+            # Re-check: another request may have added it while we were probing
+            if stream_name in self.active_streams:
+                logger.warning(f"Stream {stream_name} already exists")
+                if cap is not None:
+                    cap.release()
+                return False
+            
+            # One decoder per source: a stream on an already-registered camera reads
+            # that stream's slot and status and shares its monitor thread instead of
+            # opening it a second time; both are looked up through 'source' on every
+            # access, so a re-added source is picked up by its sharers
+            # (demo streams are synthetic and per-name, so they are never shared)
+            source = stream_name
+            if rtsp_url != "demo":
+                source = next((name for name, info in self.active_streams.items()
+                               if info['url'] == rtsp_url and info.get('source', name) == name),
+                              stream_name)
+            
+            # Latest-frame slot for this stream, and the viewers' wake-up for on-demand
+            # frames; created before the stream becomes visible in active_streams
+            if source == stream_name:
+                self.latest_frames[stream_name] = LatestFrame()
+                self.frame_requests[stream_name] = threading.Event()
+            else:
+                logger.info(f"Stream {stream_name} shares the capture of {source}")
+            
+            self.active_streams[stream_name] = {
+                'url': rtsp_url,
+                'location': location,
+                'active': True,
+                'last_update': None,
+                'added_date': datetime.now().isoformat(),
+                'error_count': 0,
+                'source': source
+            }
+            
+            if start_monitoring:
+                self.start_stream_monitoring(stream_name, cap=cap)
+            elif cap is not None:
+                cap.release()
         
         # Save to database
-        self.save_streams_to_db()
+        if save:
+            self.save_streams_to_db()
         
         logger.info(f"Successfully added stream: {stream_name} at location: {location}")
         return True
     
-    def add_webcam_stream(self, stream_name="Live Webcam", location="Your Location"):
-        """Add webcam as a stream for testing"""
+    def add_webcam_stream(self, stream_name="Live Webcam", location="Your Location", cap=None):
+        """Add webcam as a stream for testing.
+
+        An already-opened and probed `cap` is reused by the monitor thread instead of
+        re-opening the device (a V4L2 re-open costs hundreds of milliseconds).
+        """
         logger.info(f"Attempting to add webcam stream: {stream_name}")
 
         webcam_url = "0"
 
         # ✅ Fix: Remove existing webcam stream if already present
-        if stream_name in self.active_streams:
-            logger.warning(f"Stream {stream_name} already exists — removing and reinitializing.")
-            try:
-                del self.active_streams[stream_name]
-                logger.info(f"Removed old stream entry for {stream_name}.")
-            except Exception as e:
-                logger.error(f"Failed to remove old webcam stream: {e}")
+        with self._lock:
+            if stream_name in self.active_streams:
+                logger.warning(f"Stream {stream_name} already exists — removing and reinitializing.")
+                try:
+                    # Stop the old monitor thread so it releases the device
+                    self.active_streams[stream_name]['active'] = False
+                    old_thread = self.stream_threads.pop(stream_name, None)
+                    if old_thread is not None:
+                        old_thread.join(timeout=2)
+                    del self.active_streams[stream_name]
+                    logger.info(f"Removed old stream entry for {stream_name}.")
+                except Exception as e:
+                    logger.error(f"Failed to remove old webcam stream: {e}")
 
-        # Test if webcam is available
+        # Test if webcam is available (skipped when the caller already probed it)
         try:
-            cap = cv2.VideoCapture(0)
-            if cap.isOpened():
-                ret, frame = cap.read()
-                cap.release()
-                if ret and frame is not None:
-                    logger.info(f"Webcam is available, adding stream: {stream_name}")
-                    return self.add_stream(stream_name, webcam_url, location)
+            if cap is None:
+                cap = self.open_capture(webcam_url)
+                if not cap.isOpened():
+                    logger.error("Webcam not accessible or already in use.")
+                    cap.release()
+                    cap = None
                 else:
-                    logger.error("Webcam opened but cannot read frames")
-            else:
-                logger.error("Webcam not accessible or already in use.")
+                    ret, frame = cap.read()
+                    if not ret or frame is None:
+                        logger.error("Webcam opened but cannot read frames")
+                        cap.release()
+                        cap = None
+
+            if cap is not None:
+                logger.info(f"Webcam is available, adding stream: {stream_name}")
+                if self.add_stream(stream_name, webcam_url, location, cap=cap):
+                    return True
+                cap.release()
         except Exception as e:
             logger.error(f"Error testing webcam: {e}")
 
@@ -316,64 +717,112 @@ class CCTVManager:
         return False
 
     
+    def open_capture(self, source):
+        """Open a webcam ("0") or network stream with a single-frame driver buffer.
+
+        Network streams are forced onto the FFmpeg backend with hardware decoding
+        (VAAPI/CUDA/D3D11, whichever is available) so H.264 decode leaves the CPU.
+        """
+        if source == "0":
+            # On Linux talk to V4L2 directly instead of letting OpenCV probe for a
+            # GStreamer pipeline, which adds an extra buffering/copy stage per frame
+            api = cv2.CAP_V4L2 if sys.platform.startswith('linux') else cv2.CAP_ANY
+            cap = cv2.VideoCapture(0, api)
+        else:
+            # Timeouts must be passed as open params; setting them after open has no effect
+            timeout_ms = int(getattr(self.config, 'RTSP_TIMEOUT', 10) * 1000)
+            cap = cv2.VideoCapture(source, cv2.CAP_FFMPEG, [
+                cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY,
+                cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, timeout_ms,
+                cv2.CAP_PROP_READ_TIMEOUT_MSEC, timeout_ms,
+            ])
+        # Keep only the newest frame so read() never returns a stale one
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        return cap
+    
     def test_rtsp_connection(self, rtsp_url):
-        """Test if RTSP stream is accessible"""
+        """Test if RTSP stream is accessible by grabbing a single frame"""
+        cap = self.probe_capture(rtsp_url)
+        if cap is None:
+            return False
+        cap.release()
+        return True
+    
+    def probe_capture(self, rtsp_url):
+        """Open a network stream and grab one frame; returns the open capture so the
+        monitor thread can keep using it, or None if the stream isn't usable"""
         try:
             logger.info(f"Testing RTSP connection: {rtsp_url}")
-            cap = cv2.VideoCapture(rtsp_url)
-            cap.set(cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, 1000)
-            
-            if not cap.isOpened():
-                return False
+            # Fail fast on unreachable hosts instead of waiting out the FFmpeg open timeout
+            connect_timeout = getattr(self.config, 'RTSP_CONNECT_TIMEOUT', 2)
+            if not is_host_reachable(rtsp_url, connect_timeout):
+                logger.warning(f"Camera host unreachable: {rtsp_url}")
+                return None
             
-            # Try to read a frame with timeout
-            start_time = time.time()
-            while (time.time() - start_time) < 10:
-                ret, frame = cap.read()
-                if ret and frame is not None:
-                    cap.release()
-                    return True
-                time.sleep(0.03)
+            cap = self.open_capture(rtsp_url)
             
-            cap.release()
-            return False
+            # One grab proves the stream delivers data; the read timeout bounds the wait
+            if not cap.isOpened() or not cap.grab():
+                cap.release()
+                return None
+            return cap
             
         except Exception as e:
             logger.error(f"RTSP connection test failed for {rtsp_url}: {e}")
-            return False
+            return None
     
-    def start_stream_monitoring(self, stream_name):
-        """Start monitoring a specific stream"""
-        if stream_name not in self.active_streams:
-            logger.error(f"Stream {stream_name} not found")
-            return False
-        
-        if stream_name in self.stream_threads and self.stream_threads[stream_name].is_alive():
-            logger.warning(f"Stream {stream_name} is already being monitored")
-            return True
-        
-        # Start monitoring thread
-        self.running = True
-        thread = threading.Thread(
-            target=self._monitor_stream,
-            args=(stream_name,),
-            daemon=True
-        )
-        thread.start()
-        self.stream_threads[stream_name] = thread
+    def start_stream_monitoring(self, stream_name, cap=None):
+        """Start monitoring a specific stream, optionally with an already-opened capture"""
+        with self._lock:
+            if stream_name not in self.active_streams:
+                logger.error(f"Stream {stream_name} not found")
+                return False
+            
+            # Streams sharing another stream's capture are fed by that stream's thread
+            source = self.active_streams[stream_name].get('source', stream_name)
+            if source != stream_name:
+                return self.start_stream_monitoring(source, cap=cap)
+            
+            if stream_name in self.stream_threads and self.stream_threads[stream_name].is_alive():
+                logger.warning(f"Stream {stream_name} is already being monitored")
+                if cap is not None:
+                    cap.release()
+                return True
+            
+            # Start monitoring thread
+            self.running = True
+            thread = threading.Thread(
+                target=self._monitor_stream,
+                args=(stream_name, cap),
+                daemon=True
+            )
+            thread.start()
+            self.stream_threads[stream_name] = thread
         
         logger.info(f"Started monitoring stream: {stream_name}")
         return True
     
-    def _monitor_stream(self, stream_name):
-        """Monitor stream and capture frames with webcam support"""
+    def _build_demo_template(self, stream_name):
+        """Draw the static text of a demo stream frame once; only the timestamp changes"""
+        template = np.full((480, 640, 3), 255, dtype=np.uint8)
+        cv2.putText(template, f"Stream: {stream_name}", (50, 150), 
+                   cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 2)
+        cv2.putText(template, "Face Detection System", (50, 200), 
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 0), 2)
+        cv2.putText(template, "Look at webcam for face detection", (50, 250), 
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1)
+        return template
+    
+    def _monitor_stream(self, stream_name, cap=None):
+        """Monitor stream and capture frames from a webcam, a network camera or the demo generator"""
         stream_info = self.active_streams[stream_name]
+        reader = None
         
-        # Initialize webcam if this is a webcam stream
-        cap = None
+        # Initialize webcam if this is a webcam stream (reusing the probe's capture if given)
         if stream_info['url'] == "0":
             try:
-                cap = cv2.VideoCapture(0)
+                if cap is None:
+                    cap = self.open_capture("0")
                 cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
                 cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
                 cap.set(cv2.CAP_PROP_FPS, 25)  # Set target FPS for smooth streaming
@@ -381,224 +830,426 @@ class CCTVManager:
             except Exception as e:
                 logger.error(f"Failed to initialize webcam: {e}")
                 return
+        elif stream_info['url'] != "demo":
+            # Opened inside the loop so a failed open goes through the reconnect backoff
+            network_cap, cap = cap, None
+        else:
+            demo_template = self._build_demo_template(stream_name)
         
+        frame_requested = self.frame_requests[stream_name]
+        frame_interval = 1.0 / getattr(self.config, 'STREAM_FPS', 25)
+        last_frame_time = 0.0
+        last_watched = 0.0
         while self.running and stream_info['active']:
             try:
                 if stream_info['url'] == "0" and cap is not None:
-                    # Read from webcam
-                    ret, frame = cap.read()
-                    if not ret:
+                    # Read from webcam; grab() paces the loop at camera FPS and drains
+                    # frames that queued up while the previous one was processed
+                    frame = read_latest(cap, last_frame_time + frame_interval)
+                    last_frame_time = time.monotonic()
+                    if frame is None:
                         logger.warning("Failed to read from webcam")
                         time.sleep(0.05)
                         continue
-                    # Resize for consistency
-                    frame = cv2.resize(frame, (640, 480))
+                    # Resize for consistency; most drivers honour the requested 640x480,
+                    # in which case the copy is skipped
+                    frame = fit_frame(frame)
+                elif stream_info['url'] != "demo":
+                    # Read from network camera, reconnecting if it stalls
+                    if reader is None:
+                        try:
+                            # The probe's capture is handed over on the first open only
+                            reader = self._open_network_reader(stream_info['url'], cap=network_cap)
+                        except Exception as e:
+                            logger.error(f"Failed to open network stream {stream_name}: {e}")
+                            if network_cap is not None:
+                                network_cap.release()
+                            self._reconnect_backoff(stream_name, stream_info)
+                            continue
+                        finally:
+                            network_cap = None
+                    frame = reader.read(last_frame_time + frame_interval)
+                    last_frame_time = time.monotonic()
+                    if frame is None:
+                        reader.release()
+                        reader = None
+                        self._reconnect_backoff(stream_name, stream_info)
+                        continue
+                    if stream_info['error_count']:
+                        stream_info['error_count'] = 0
                 else:
-                    # Create demo frame for non-webcam streams
-                    frame = np.ones((480, 640, 3), dtype=np.uint8) * 255
-                    cv2.putText(frame, f"Stream: {stream_name}", (50, 150), 
-                               cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 2)
-                    cv2.putText(frame, "Face Detection System", (50, 200), 
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 0), 2)
-                    cv2.putText(frame, "Look at webcam for face detection", (50, 250), 
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1)
-                    cv2.putText(frame, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), (50, 300), 
+                    # Demo frames are made on demand: up to 10 FPS while viewers are
+                    # asking for frames, 1 FPS when nobody is watching
+                    elapsed = time.monotonic() - last_frame_time
+                    if elapsed < 0.1:
+                        time.sleep(0.1 - elapsed)
+                    if frame_requested.wait(timeout=1.0):
+                        last_watched = time.monotonic()
+                    frame_requested.clear()
+                    last_frame_time = time.monotonic()
+                    
+                    # Demo frame for non-webcam streams: static template + timestamp
+                    frame = demo_template.copy()
+                    cv2.putText(frame, _timestamp_str(), (50, 300), 
                                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1)
                 
-                # Update stream info
-                stream_info['last_frame'] = frame
-                stream_info['last_update'] = datetime.now()
-                
-                # Put frame in queue
-                if not self.frame_queues[stream_name].empty():
-                    try:
-                        self.frame_queues[stream_name].get_nowait()
-                    except:
-                        pass
+                # Lost-person matching runs on every stream, watched or not
+                self._detect_faces(stream_name, frame)
                 
-                self.frame_queues[stream_name].put(frame)
-                
-                time.sleep(0.1)  # 10 FPS for smooth video
+                # Overlays and the JPEG encode are only for viewers: render while frames
+                # have been requested recently, otherwise keep the last encoded image
+                if frame_requested.is_set():
+                    frame_requested.clear()
+                    last_watched = time.monotonic()
+                slot = self.latest_frames[stream_name]
+                if time.monotonic() - last_watched < self.VIEWER_IDLE_SECONDS:
+                    jpeg = self._render_frame(stream_name, frame.copy())
+                else:
+                    jpeg = slot.get()[1]
+                # The slot keeps the raw frame for detection done elsewhere
+                slot.put(frame, jpeg)
+                stream_info['last_update'] = time.time()  # formatted lazily in get_stream_status
                 
             except Exception as e:
                 logger.error(f"Error in stream monitoring for {stream_name}: {e}")
                 time.sleep(0.05)
         
-        # Release webcam when done
+        # Release webcam / network capture when done
         if cap is not None:
             cap.release()
             logger.info(f"Webcam released for {stream_name}")
+        if reader is not None:
+            reader.release()
+            logger.info(f"Network stream released for {stream_name}")
     
-    def get_current_frame(self, stream_name):
-        """Return the latest frame for a given stream, using queue fallback, placeholder,
-        and lightweight face detection+matching overlays (red = matched, blue = unknown)."""
+    def _open_network_reader(self, url, cap=None):
+        """Open a network stream with the decoder selected in config"""
+        return NetworkStreamReader(
+            url, self.open_capture,
+            use_ffmpeg=getattr(self.config, 'STREAM_DECODER', 'opencv') == 'ffmpeg',
+            fps=getattr(self.config, 'STREAM_FPS', 25),
+            timeout=getattr(self.config, 'RTSP_TIMEOUT', 10),
+            cap=cap
+        )
+    
+    def _reconnect_backoff(self, stream_name, stream_info):
+        """Wait before reconnecting a failed stream: 1 s, doubling per consecutive
+        failure up to 30 s, so a dead camera doesn't keep the thread reopening it"""
+        stream_info['error_count'] += 1
+        delay = min(2 ** (stream_info['error_count'] - 1), 30)
+        logger.warning(f"Lost network stream {stream_name}, reconnecting in {delay}s "
+                       f"(attempt {stream_info['error_count']})")
+        deadline = time.monotonic() + delay
+        # Sleep in short steps so stopping the stream isn't held up by the backoff
+        while self.running and stream_info['active'] and time.monotonic() < deadline:
+            time.sleep(0.5)
+    
+    def _source_of(self, stream_name):
+        """Name of the stream whose capture, frames and status `stream_name` uses"""
+        return self.active_streams.get(stream_name, {}).get('source', stream_name)
+    
+    def get_current_frame(self, stream_name, as_base64=False):
+        """Return the latest JPEG frame for a given stream, with the face detection
+        overlays drawn by the monitor thread (red = matched, blue = unknown), or a
+        placeholder before the first frame has been captured. With `as_base64` the
+        JPEG is returned as a base64 string."""
         try:
             if stream_name not in self.active_streams:
                 logger.warning(f"Unknown stream requested: {stream_name}")
                 return None
 
-            frame = None
-            # Try from queue (freshest)
-            if stream_name in self.frame_queues and not self.frame_queues[stream_name].empty():
-                try:
-                    frame = self.frame_queues[stream_name].get_nowait()
-                    self.active_streams[stream_name]["last_frame"] = frame
-                except Exception:
-                    frame = self.active_streams[stream_name].get("last_frame")
-            else:
-                # fallback to cached frame
-                frame = self.active_streams[stream_name].get("last_frame")
+            source = self._source_of(stream_name)
+            self.frame_requests[source].set()
+            _, jpeg, _ = self.latest_frames[source].get()
 
             # Graceful startup placeholder if no frame yet
-            if frame is None:
-                placeholder = np.zeros((480, 640, 3), dtype=np.uint8)
-                cv2.putText(placeholder, "Initializing Webcam...", (100, 240),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.9, (255, 255, 255), 2)
-                cv2.putText(placeholder, time.strftime("%H:%M:%S"), (240, 300),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (180, 180, 180), 1)
-                ret, buffer = cv2.imencode(".jpg", placeholder)
-                return buffer.tobytes()
-
-            # --- Enhanced Real-time Face Detection & Matching with Advanced Algorithms ---
-            try:
-                # Throttle detection per-stream to ~0.1s for better performance
-                now = time.time()
-                last_det = self.active_streams[stream_name].get("_last_detect_time", 0)
-                do_detect = (now - last_det) >= 0.1  # 10 FPS detection rate
-
-                if do_detect and hasattr(self.config, "face_matcher") and self.config.face_matcher is not None:
-                    # Use advanced multi-algorithm real-time detection
-                    matches = self.config.face_matcher.detect_and_match_faces_realtime(
-                        frame, 
-                        self.lost_face_encodings, 
-                        self.lost_face_names,
-                        threshold=0.65
-                    )
+            if jpeg is None:
+                jpeg = self._placeholder_jpeg()
+
+            if as_base64:
+                return self._jpeg_base64(stream_name, jpeg)
+            return jpeg
+
+        except Exception as e:
+            logger.error(f"Error retrieving current frame for {stream_name}: {e}")
+            return None
+    
+    def _jpeg_base64(self, stream_name, jpeg):
+        """Base64-encode a stream's JPEG, reusing the result while the frame is unchanged"""
+        cached_jpeg, cached_text = self._base64_cache.get(stream_name, (None, None))
+        if cached_jpeg is jpeg:
+            return cached_text
+        if PYBASE64_AVAILABLE:
+            text = pybase64.b64encode_as_string(jpeg)
+        else:
+            text = base64.b64encode(jpeg).decode('ascii')
+        self._base64_cache[stream_name] = (jpeg, text)
+        return text
+    
+    def wait_for_frame(self, stream_name, after=None, timeout=1.0):
+        """Block until a stream publishes a frame newer than `after`.
+
+        Returns (jpeg, timestamp); jpeg falls back to the placeholder on timeout
+        before the first frame, and is None for unknown streams.
+        """
+        source = self._source_of(stream_name)
+        if source not in self.latest_frames:
+            return None, None
+        self.frame_requests[source].set()
+        _, jpeg, timestamp = self.latest_frames[source].wait(after, timeout)
+        if jpeg is None:
+            jpeg = self.get_current_frame(stream_name)
+        return jpeg, timestamp
+    
+    def _placeholder_jpeg(self):
+        """Return the encoded startup placeholder, re-encoded at most once per second
+        (its clock has one-second resolution)"""
+        second = int(time.time())
+        cached_second, jpeg = self._placeholder_cache
+        if cached_second != second or jpeg is None:
+            placeholder = self._placeholder_template.copy()
+            cv2.putText(placeholder, time.strftime("%H:%M:%S"), (240, 300),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (180, 180, 180), 1)
+            jpeg = self._encode_jpeg(placeholder)
+            self._placeholder_cache = (second, jpeg)
+        return jpeg
+    
+    def get_raw_frame(self, stream_name):
+        """Return a copy of a stream's latest raw BGR frame (no overlays), or None"""
+        source = self._source_of(stream_name)
+        if source not in self.latest_frames:
+            return None
+        self.frame_requests[source].set()
+        frame = self.latest_frames[source].get()[0]
+        return None if frame is None else frame.copy()
+    
+    def get_detected_faces(self, stream_name):
+        """Return (timestamp, faces) from the monitor thread's last detection pass, where
+        each face is {'bbox', 'embedding'} in frame coordinates; (None, []) before the first"""
+        if stream_name not in self.active_streams:
+            return None, []
+        source = self._source_of(stream_name)
+        self.frame_requests[source].set()
+        return self._detected_faces.get(source, (None, []))
+    
+    def set_extra_overlays(self, stream_name, faces_timestamp, overlays):
+        """Add (x1, y1, x2, y2, name, confidence, is_found) overlays computed from the
+        faces of pass `faces_timestamp`; drawn by the monitor thread with its own"""
+        if stream_name in self.active_streams:
+            self._extra_overlays[self._source_of(stream_name)] = (faces_timestamp, overlays)
+    
+    def _detect_faces(self, stream_name, frame):
+        """Run throttled face detection and lost-person matching on a raw frame"""
+        stream_info = self.active_streams[stream_name]
+        now = time.time()
+        do_detect = (getattr(self.config, "face_matcher", None) is not None
+                     and (now - stream_info.get("_last_detect_time", 0)) >= 0.1)
+
+        # --- Enhanced Real-time Face Detection & Matching with Advanced Algorithms ---
+        try:
+            # Skip detection on a static scene: the previous overlays still apply
+            if do_detect:
+                frame_hash = frame_dhash(frame)
+                last_hash = stream_info.get('_last_frame_hash')
+                if (last_hash is not None
+                        and hamming_distance(frame_hash, last_hash) < self.UNCHANGED_FRAME_BITS
+                        and now - stream_info.get('_last_full_detect_time', 0) < self.DETECTION_REFRESH_SECONDS):
+                    do_detect = False
+                    stream_info['_last_detect_time'] = now
+                else:
+                    stream_info['_last_frame_hash'] = frame_hash
+                    stream_info['_last_full_detect_time'] = now
+            
+            # Throttle detection per-stream to ~0.1s (10 FPS detection rate)
+            if do_detect:
+                # Use advanced multi-algorithm real-time detection
+                faces = []
+                lost_matrix, lost_norms, lost_names = self._lost_match_table
+                matches = self.config.face_matcher.detect_and_match_faces_realtime(
+                    frame, 
+                    lost_matrix, 
+                    lost_names,
+                    threshold=0.65,
+                    faces_out=faces,
+                    lost_norms=lost_norms
+                )
+                self._detected_faces[stream_name] = (now, faces)
+                
+                overlays = []  # list of (x1,y1,x2,y2,name,conf, is_found)
+                
+                for match in matches:
+                    x1, y1, x2, y2 = map(int, match['bbox'])
+                    name = match['name']
+                    confidence = match['similarity']
+                    is_found = match['found']
                     
-                    overlays = []  # list of (x1,y1,x2,y2,name,conf, is_found)
+                    overlays.append((x1, y1, x2, y2, name, confidence, is_found))
                     
-                    for match in matches:
-                        x1, y1, x2, y2 = map(int, match['bbox'])
-                        name = match['name']
-                        confidence = match['similarity']
-                        is_found = match['found']
-                        
-                        overlays.append((x1, y1, x2, y2, name, confidence, is_found))
-                        
-                        # Log found persons with enhanced information
+                    # Log found persons with enhanced information
+                    if is_found:
+                        logger.info(f"🚨 FOUND MISSING PERSON: {name} in stream {stream_name} "
+                                  f"(similarity: {confidence:.3f}, "
+                                  f"confidence: {match['confidence']}, "
+                                  f"algorithm: {match['algorithm']})")
+                
+                # Store overlays and update last detect time
+                if overlays:
+                    self.active_streams[stream_name]['_last_overlays'] = overlays
+                    # Log found persons
+                    for _, _, _, _, name, conf, is_found in overlays:
                         if is_found:
-                            logger.info(f"🚨 FOUND MISSING PERSON: {name} in stream {stream_name} "
-                                      f"(similarity: {confidence:.3f}, "
-                                      f"confidence: {match['confidence']}, "
-                                      f"algorithm: {match['algorithm']})")
-                    
-                    # Store overlays and update last detect time
-                    if overlays:
-                        self.active_streams[stream_name]['_last_overlays'] = overlays
-                        # Log found persons
-                        for _, _, _, _, name, conf, is_found in overlays:
-                            if is_found:
-                                logger.info(f"[ALERT] {name} FOUND at {stream_name} with confidence {conf:.3f}")
-                    else:
-                        self.active_streams[stream_name].pop('_last_overlays', None)
-                    self.active_streams[stream_name]['_last_detect_time'] = now
+                            logger.info(f"[ALERT] {name} FOUND at {stream_name} with confidence {conf:.3f}")
+                else:
+                    self.active_streams[stream_name].pop('_last_overlays', None)
+                self.active_streams[stream_name]['_last_detect_time'] = now
 
-            except Exception as e:
-                # Ensure detection errors never break frame serving
-                logger.debug(f"Face detection/matching skipped due to error: {e}")
+        except Exception as e:
+            # Ensure detection errors never break frame serving
+            logger.debug(f"Face detection/matching skipped due to error: {e}")
+    
+    def _render_frame(self, stream_name, frame):
+        """Draw the latest detection overlays on a frame and encode it to JPEG"""
+        stream_info = self.active_streams[stream_name]
+        now = time.time()
+        
+        # Draw overlays with FOUND/Unknown labeling; overlays supplied for recent faces
+        # (e.g. registered-person matches from the routes) are drawn in the same style
+        overlays_to_draw = self.active_streams[stream_name].get('_last_overlays', [])
+        faces_timestamp = self._detected_faces.get(stream_name, (None, []))[0]
+        extra_timestamp, extra_overlays = self._extra_overlays.get(stream_name, (None, []))
+        if (extra_overlays and faces_timestamp is not None
+                and faces_timestamp - extra_timestamp <= self.EXTRA_OVERLAY_GRACE_SECONDS):
+            overlays_to_draw = overlays_to_draw + extra_overlays
+        found_persons = []  # Track found persons for alert banner
+        
+        try:
+            for (x1, y1, x2, y2, name, conf, is_found) in overlays_to_draw:
+                # Clamp coordinates
+                h, w = frame.shape[:2]
+                x1c, y1c = max(0, int(x1)), max(0, int(y1))
+                x2c, y2c = min(w - 1, int(x2)), min(h - 1, int(y2))
 
-            # Draw overlays with FOUND/Unknown labeling
-            overlays_to_draw = self.active_streams[stream_name].get('_last_overlays', [])
-            found_persons = []  # Track found persons for alert banner
-            
-            try:
-                for (x1, y1, x2, y2, name, conf, is_found) in overlays_to_draw:
-                    # Clamp coordinates
-                    h, w = frame.shape[:2]
-                    x1c, y1c = max(0, int(x1)), max(0, int(y1))
-                    x2c, y2c = min(w - 1, int(x2)), min(h - 1, int(y2))
+                # Choose color: RED for FOUND persons, BLUE for unknown
+                if is_found:
+                    color = (0, 0, 255)   # Red (BGR) for FOUND persons
+                    label = f"🚨 {name} FOUND"
+                    found_persons.append(name)
+                    # Draw thicker rectangle for found persons
+                    cv2.rectangle(frame, (x1c, y1c), (x2c, y2c), color, 3)
+                else:
+                    color = (255, 0, 0)   # Blue (BGR) for unknown
+                    label = "Unknown"
+                    cv2.rectangle(frame, (x1c, y1c), (x2c, y2c), color, 2)
 
-                    # Choose color: RED for FOUND persons, BLUE for unknown
-                    if is_found:
-                        color = (0, 0, 255)   # Red (BGR) for FOUND persons
-                        label = f"🚨 {name} FOUND"
-                        found_persons.append(name)
-                        # Draw thicker rectangle for found persons
-                        cv2.rectangle(frame, (x1c, y1c), (x2c, y2c), color, 3)
-                    else:
-                        color = (255, 0, 0)   # Blue (BGR) for unknown
-                        label = "Unknown"
-                        cv2.rectangle(frame, (x1c, y1c), (x2c, y2c), color, 2)
-
-                    # Draw label with background for better visibility
-                    (tw, th), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)
-                    cv2.rectangle(frame, (x1c, y1c - th - 8), (x1c + tw + 4, y1c), color, -1)
-                    cv2.putText(frame, label, (x1c + 2, y1c - 4),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+                # Draw label with background for better visibility
+                (tw, th), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)
+                cv2.rectangle(frame, (x1c, y1c - th - 8), (x1c + tw + 4, y1c), color, -1)
+                cv2.putText(frame, label, (x1c + 2, y1c - 4),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+            
+            # Draw alert banner at top if any persons were found
+            if found_persons:
+                alert_text = f"🚨 FOUND: {', '.join(found_persons)} 🚨"
+                (tw, th), _ = cv2.getTextSize(alert_text, cv2.FONT_HERSHEY_DUPLEX, 1.2, 3)
+                banner_y = 50
+                # Draw background rectangle for banner
+                cv2.rectangle(frame, (10, banner_y - th - 10), (10 + tw + 20, banner_y + 10), (0, 0, 255), -1)
+                cv2.putText(frame, alert_text, (20, banner_y),
+                            cv2.FONT_HERSHEY_DUPLEX, 1.2, (255, 255, 255), 3)
                 
-                # Draw alert banner at top if any persons were found
-                if found_persons:
-                    alert_text = f"🚨 FOUND: {', '.join(found_persons)} 🚨"
-                    (tw, th), _ = cv2.getTextSize(alert_text, cv2.FONT_HERSHEY_DUPLEX, 1.2, 3)
-                    banner_y = 50
-                    # Draw background rectangle for banner
-                    cv2.rectangle(frame, (10, banner_y - th - 10), (10 + tw + 20, banner_y + 10), (0, 0, 255), -1)
-                    cv2.putText(frame, alert_text, (20, banner_y),
-                                cv2.FONT_HERSHEY_DUPLEX, 1.2, (255, 255, 255), 3)
-                    
-            except Exception as e:
-                logger.debug(f"Overlay drawing skipped: {e}")
+        except Exception as e:
+            logger.debug(f"Overlay drawing skipped: {e}")
 
-            # --- End detection & overlay block ---
-            if not overlays_to_draw:
-                try:
+        # --- End detection & overlay block ---
+        if not overlays_to_draw and self._face_cascade is not None:
+            try:
+                # Cosmetic boxes only, so re-detect at the detection rate (~0.1s) and
+                # redraw the cached boxes in between
+                if now - stream_info.get('_last_haar_time', 0) >= 0.1:
                     gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                    cascade_path = os.path.join(cv2.data.haarcascades, "haarcascade_frontalface_default.xml")
-                    if not os.path.exists(cascade_path):
-                        logger.error(f"❌ Haarcascade not found at {cascade_path}")
-                    face_cascade = cv2.CascadeClassifier(cascade_path)
-
-                    faces = face_cascade.detectMultiScale(gray, 1.1, 4)
-                    for (x, y, w, h) in faces:
-                        cv2.rectangle(frame, (x, y), (x + w, y + h), (255, 0, 0), 2)
-                        # Show Unknown when no match overlays exist
-                        cv2.putText(frame, "Unknown", (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 0, 0), 2)
-                except Exception as e:
-                    logger.warning(f"OpenCV fallback detection failed: {e}")
-
-            # Encode real frame (with overlays)
-            ret, buffer = cv2.imencode(".jpg", frame)
-            if not ret:
-                logger.error(f"Frame encoding failed for {stream_name}")
-                return None
-
-            return buffer.tobytes()
+                    stream_info['_haar_faces'] = self._face_cascade.detectMultiScale(gray, 1.1, 4)
+                    stream_info['_last_haar_time'] = now
+                for (x, y, w, h) in stream_info.get('_haar_faces', ()):
+                    cv2.rectangle(frame, (x, y), (x + w, y + h), (255, 0, 0), 2)
+                    # Show Unknown when no match overlays exist
+                    cv2.putText(frame, "Unknown", (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 0, 0), 2)
+            except Exception as e:
+                logger.warning(f"OpenCV fallback detection failed: {e}")
 
-        except Exception as e:
-            logger.error(f"Error retrieving current frame for {stream_name}: {e}")
+        # Encode real frame (with overlays)
+        jpeg = self._encode_jpeg(frame)
+        if jpeg is None:
+            logger.error(f"Frame encoding failed for {stream_name}")
             return None
 
-
+        return jpeg
+    
+    def _encode_jpeg(self, frame):
+        """Encode a BGR frame to JPEG bytes, on the GPU (nvJPEG) or with libjpeg-turbo
+        when available"""
+        # Optional smaller preview: encode cost and bytes scale with pixel count
+        if self.preview_size and (frame.shape[1], frame.shape[0]) != tuple(self.preview_size):
+            frame = cv2.resize(frame, tuple(self.preview_size), interpolation=cv2.INTER_AREA)
+        
+        if self._gpu_jpeg:
+            try:
+                pinned = getattr(self._pinned_frames, 'buffer', None)
+                if pinned is None or tuple(pinned.shape) != frame.shape:
+                    pinned = torch.empty(frame.shape, dtype=torch.uint8).pin_memory()
+                    self._pinned_frames.buffer = pinned
+                # The encode's .cpu() synchronizes, so the buffer is free again on return
+                pinned.numpy()[...] = frame
+                tensor = pinned.to('cuda', non_blocking=True)
+                tensor = tensor.flip(-1).permute(2, 0, 1).contiguous()  # BGR HWC -> RGB CHW
+                return encode_jpeg(tensor, quality=self.jpeg_quality).cpu().numpy().tobytes()
+            except Exception as e:
+                logger.warning(f"GPU JPEG encoding failed, falling back to OpenCV: {e}")
+                self._gpu_jpeg = False
+        
+        if self._turbojpeg is not None:
+            return self._turbojpeg.encode(frame, quality=self.jpeg_quality,
+                                          pixel_format=TJPF_BGR, jpeg_subsample=TJSAMP_420)
+        
+        ret, buffer = cv2.imencode(".jpg", frame, self._jpeg_params)
+        if not ret:
+            return None
+        return buffer.tobytes()
     
     def get_stream_status(self):
         """Get status of all streams"""
+        with self._lock:
+            streams = dict(self.active_streams)
         status = {}
-        for stream_name, stream_info in self.active_streams.items():
-            status[stream_name] = {
-                'location': stream_info['location'],
-                'active': stream_info['active'],
-                'last_update': stream_info['last_update'],
-                'error_count': stream_info['error_count'],
-                'url': stream_info['url']
-            }
+        for stream_name, stream_info in streams.items():
+            stream_status = {key: stream_info[key] for key in self.STATUS_FIELDS}
+            # Streams sharing a capture report the live state of their source
+            source_info = streams.get(stream_info.get('source', stream_name), stream_info)
+            for key in self.SOURCE_STATUS_FIELDS:
+                stream_status[key] = source_info[key]
+            status[stream_name] = stream_status
+        for stream_status in status.values():
+            if stream_status['last_update'] is not None:
+                stream_status['last_update'] = datetime.fromtimestamp(stream_status['last_update'])
         return status
     
+    def count_streams(self):
+        """Return (total, active) stream counts without building the full status"""
+        streams = dict(self.active_streams)
+        active = sum(1 for stream_info in streams.values()
+                     if streams.get(stream_info.get('source'), stream_info)['active'])
+        return len(streams), active
+    
     def stop_all_streams(self):
         """Stop all stream monitoring"""
         self.running = False
-        for thread in self.stream_threads.values():
+        with self._lock:
+            threads = list(self.stream_threads.values())
+        for thread in threads:
             thread.join(timeout=5)
         
+        # Flush a pending stream DB write before shutdown
+        self._flush_streams_db()
+        
         logger.info("All stream monitoring stopped")
         
         
\ No newline at end of file
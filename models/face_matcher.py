@@ -1,9 +1,11 @@
 import cv2
 import numpy as np
 import logging
+import threading
+import time
 import insightface
 from insightface.app import FaceAnalysis
-from utils.augmentations import get_augmentations
+from utils.augmentations import get_augmentations_serve
 
 # Try to import optional libraries
 try:
@@ -24,23 +26,36 @@ try:
 except ImportError:
     DLIB_AVAILABLE = False
 
-from datetime import datetime
+# Run InsightFace on the GPU when onnxruntime-gpu is installed
+try:
+    import onnxruntime
+    ONNXRUNTIME_AVAILABLE = True
+    CUDA_PROVIDER_AVAILABLE = 'CUDAExecutionProvider' in onnxruntime.get_available_providers()
+except ImportError:
+    ONNXRUNTIME_AVAILABLE = False
+    CUDA_PROVIDER_AVAILABLE = False
 
 logger = logging.getLogger(__name__)
 
 class AdvancedFaceMatcher:
-    def __init__(self, model_name='buffalo_l', det_size=(640, 640)):
+    def __init__(self, model_name='buffalo_l', det_size=(640, 640), intra_op_threads=0):
         self.model_name = model_name
         self.det_size = det_size
         self.similarity_threshold = 0.6
         self.quality_threshold = 0.7
-        self.augmentations = get_augmentations()
+        self.augmentations = get_augmentations_serve()
         
         # Initialize multiple face detection algorithms
         try:
-            self.insight_app = FaceAnalysis(name=model_name, providers=['CPUExecutionProvider'])
-            self.insight_app.prepare(ctx_id=0, det_size=det_size)
-            logger.info("InsightFace model loaded successfully")
+            if CUDA_PROVIDER_AVAILABLE:
+                providers = ['CUDAExecutionProvider', 'CPUExecutionProvider']
+            else:
+                providers = ['CPUExecutionProvider']
+            self.insight_app = FaceAnalysis(name=model_name, providers=providers)
+            if ONNXRUNTIME_AVAILABLE:
+                self._tune_sessions(providers, intra_op_threads)
+            self.insight_app.prepare(ctx_id=0 if CUDA_PROVIDER_AVAILABLE else -1, det_size=det_size)
+            logger.info(f"InsightFace model loaded successfully ({providers[0]})")
         except Exception as e:
             logger.error(f"Failed to load InsightFace model: {e}")
             raise
@@ -82,6 +97,29 @@ class AdvancedFaceMatcher:
         # Detection results storage
         self.recent_detections = []
         self.found_persons = set()
+        
+        # Per-thread RGB conversion buffer reused across frames (one monitor thread per stream)
+        self._frame_buffers = threading.local()
+    
+    def _tune_sessions(self, providers, intra_op_threads):
+        """Recreate InsightFace's ONNX sessions with explicit session options.
+
+        FaceAnalysis doesn't forward SessionOptions, so each model's session is
+        rebuilt from the same file. Every stream thread runs inference, so idle
+        intra-op workers must not spin-wait and steal CPU from the other streams.
+        """
+        for task, model in self.insight_app.models.items():
+            try:
+                options = onnxruntime.SessionOptions()
+                options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+                options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+                options.intra_op_num_threads = intra_op_threads  # 0 = one per physical core
+                options.add_session_config_entry('session.intra_op.allow_spinning', '0')
+                model.session = onnxruntime.InferenceSession(
+                    model.model_file, sess_options=options, providers=providers
+                )
+            except Exception as e:
+                logger.warning(f"Keeping default ONNX session for {task}: {e}")
     
     def preprocess_image(self, image_path):
         """Load and preprocess image"""
@@ -197,8 +235,11 @@ class AdvancedFaceMatcher:
                     logger.warning(f"Invalid face crop")
                     return None
             
+            # Keep InsightFace's float32 so comparisons stay in single precision
+            embedding = np.ascontiguousarray(embedding, dtype=np.float32)
             embedding_data = {
                 'insightface': embedding,
+                'norm': float(np.linalg.norm(embedding)),  # cached for compare_embeddings
                 'det_score': best_face['confidence'],
                 'bbox': best_face['bbox'],
                 'source': best_face['algorithm'],
@@ -225,37 +266,25 @@ class AdvancedFaceMatcher:
         try:
             # Multi-metric comparison
             if 'insightface' in embedding1 and 'insightface' in embedding2:
-                vec1 = embedding1['insightface']
-                vec2 = embedding2['insightface']
-            
-                if isinstance(vec1, list):
-                    vec1 = np.array(vec1)
-                if isinstance(vec2, list):
-                    vec2 = np.array(vec2)
+                # asarray is a no-op for arrays; lists (e.g. straight from JSON) are converted
+                vec1 = np.asarray(embedding1['insightface'], dtype=np.float32)
+                vec2 = np.asarray(embedding2['insightface'], dtype=np.float32)
+                
+                # Norms are stored at registration time; compute only when missing
+                norm1 = embedding1.get('norm') or np.linalg.norm(vec1)
+                norm2 = embedding2.get('norm') or np.linalg.norm(vec2)
+                dot = float(np.dot(vec1, vec2))
                 
                 # Cosine similarity
-                cosine_sim = np.dot(vec1, vec2) / (np.linalg.norm(vec1) * np.linalg.norm(vec2))
+                cosine_sim = dot / (norm1 * norm2)
                 
-                # Euclidean distance
-                euclidean_dist = np.linalg.norm(vec1 - vec2)
+                # Euclidean distance, from |a - b|^2 = |a|^2 + |b|^2 - 2 a.b
+                euclidean_dist = np.sqrt(max(norm1 * norm1 + norm2 * norm2 - 2 * dot, 0.0))
                 euclidean_sim = 1 / (1 + euclidean_dist)
                 
                 # Weighted combination
                 final_sim = 0.7 * cosine_sim + 0.3 * euclidean_sim
-                
-                # Enhanced confidence levels with stricter thresholds
-                if final_sim > 0.80:
-                    confidence = "EXCELLENT"
-                elif final_sim > 0.70:
-                    confidence = "VERY_HIGH"
-                elif final_sim > 0.60:
-                    confidence = "HIGH"
-                elif final_sim > 0.50:
-                    confidence = "MEDIUM"
-                elif final_sim > 0.40:
-                    confidence = "LOW"
-                else:
-                    confidence = "VERY_LOW"
+                confidence = self.confidence_level(final_sim)
                 
                 logger.info(f"🔍 Face comparison: {final_sim:.3f} similarity ({confidence})")
                 return float(final_sim), confidence
@@ -266,6 +295,38 @@ class AdvancedFaceMatcher:
             logger.error(f"❌ Error comparing embeddings: {e}")
             return 0.0, "COMPARISON_ERROR"
     
+    def compare_embeddings_batch(self, embedding, matrix, norms):
+        """Score embeddings against every row of `matrix` at once.
+
+        Same metric as compare_embeddings (0.7 * cosine + 0.3 * 1/(1 + euclidean)),
+        computed from a single matrix product; `norms` are the row norms. A single
+        query vector gives one score per row, an (F, D) stack of queries gives (F, N).
+        """
+        query = np.asarray(embedding['insightface'], dtype=np.float32)
+        query_norm = np.linalg.norm(query, axis=-1, keepdims=True)
+        dots = query @ matrix.T
+        cosine_sim = dots / (norms * query_norm)
+        # |a - b|^2 = |a|^2 + |b|^2 - 2 a.b
+        squared_dist = np.maximum(norms * norms + query_norm * query_norm - 2 * dots, 0)
+        euclidean_sim = 1 / (1 + np.sqrt(squared_dist))
+        return 0.7 * cosine_sim + 0.3 * euclidean_sim
+    
+    @staticmethod
+    def confidence_level(similarity):
+        """Map a similarity score to a confidence label"""
+        # Enhanced confidence levels with stricter thresholds
+        if similarity > 0.80:
+            return "EXCELLENT"
+        elif similarity > 0.70:
+            return "VERY_HIGH"
+        elif similarity > 0.60:
+            return "HIGH"
+        elif similarity > 0.50:
+            return "MEDIUM"
+        elif similarity > 0.40:
+            return "LOW"
+        return "VERY_LOW"
+    
     def validate_face_quality(self, embedding_data):
         """Validate if detected face meets quality standards"""
         if embedding_data is None:
@@ -290,12 +351,22 @@ class AdvancedFaceMatcher:
         
         return True, f"Face quality acceptable ({algorithm}: {det_score:.3f})"
     
-    def detect_and_match_faces_realtime(self, frame, lost_person_encodings, lost_person_names, threshold=0.65):
-        """Real-time face detection and matching with immediate alerts"""
+    def detect_and_match_faces_realtime(self, frame, lost_person_encodings, lost_person_names, threshold=0.65,
+                                        faces_out=None, lost_norms=None):
+        """Real-time face detection and matching with immediate alerts. When `faces_out`
+        is a list, every detected face is appended to it as {'bbox', 'embedding',
+        'algorithm'} so other matchers can reuse this pass instead of running the
+        detector again.
+        Pass the encodings as a prebuilt float32 matrix with its row `lost_norms` to
+        skip rebuilding them on every frame."""
         try:
-            # Convert frame to RGB if needed
+            # Convert frame to RGB if needed, into this thread's reusable buffer
             if len(frame.shape) == 3 and frame.shape[2] == 3:
-                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                buffer = getattr(self._frame_buffers, 'rgb', None)
+                if buffer is None or buffer.shape != frame.shape:
+                    buffer = np.empty_like(frame)
+                    self._frame_buffers.rgb = buffer
+                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=buffer)
             else:
                 frame_rgb = frame
             
@@ -303,7 +374,15 @@ class AdvancedFaceMatcher:
             detected_faces = self.detect_faces_multi_algorithm(frame_rgb)
             
             matches = []
-            current_time = datetime.now()
+            current_time = time.time()  # epoch seconds; formatted only when displayed
+            
+            # Match table: all lost persons as one float32 matrix, so each face is
+            # scored against everyone in a single matrix-vector product; built here
+            # only when the caller didn't pass a prebuilt one
+            if len(lost_person_encodings) > 0:
+                lost_matrix = np.asarray(lost_person_encodings, dtype=np.float32)
+                if lost_norms is None:
+                    lost_norms = np.linalg.norm(lost_matrix, axis=1)
             
             for face in detected_faces:
                 try:
@@ -321,27 +400,29 @@ class AdvancedFaceMatcher:
                     cropped_face = frame_rgb[y1:y2, x1:x2]
                     
                     if cropped_face.size > 0:
-                        # Get embedding using InsightFace
-                        insight_faces = self.insight_app.get(cropped_face)
+                        # InsightFace detections already carry their embedding from the
+                        # full-frame pass; only faces found by other detectors need a
+                        # second InsightFace run on the crop
+                        face_embedding = face.get('embedding')
+                        if face_embedding is None:
+                            insight_faces = self.insight_app.get(cropped_face)
+                            if len(insight_faces) > 0:
+                                face_embedding = insight_faces[0].embedding
+                        
+                        if faces_out is not None and face_embedding is not None:
+                            faces_out.append({'bbox': (x1, y1, x2, y2), 'embedding': face_embedding,
+                                              'algorithm': face['algorithm']})
                         
-                        if len(insight_faces) > 0:
-                            face_embedding = insight_faces[0].embedding
+                        if face_embedding is not None and len(lost_person_encodings) > 0:
                             
                             # Compare with all lost persons
-                            best_match = None
-                            best_similarity = 0
-                            best_confidence = ""
-                            
-                            for i, lost_embedding in enumerate(lost_person_encodings):
-                                similarity, confidence = self.compare_embeddings(
-                                    {'insightface': face_embedding}, 
-                                    {'insightface': lost_embedding}
-                                )
-                                
-                                if similarity > best_similarity:
-                                    best_similarity = similarity
-                                    best_match = lost_person_names[i]
-                                    best_confidence = confidence
+                            similarities = self.compare_embeddings_batch(
+                                {'insightface': face_embedding}, lost_matrix, lost_norms
+                            )
+                            best_index = int(np.argmax(similarities))
+                            best_similarity = float(similarities[best_index])
+                            best_match = lost_person_names[best_index]
+                            best_confidence = self.confidence_level(best_similarity)
                             
                             # Check if match is above threshold
                             if best_similarity >= threshold and best_match:
@@ -393,24 +474,24 @@ class AdvancedFaceMatcher:
                 'name': detection['name'],
                 'similarity': f"{detection['similarity']:.3f}",
                 'confidence': detection['confidence'],
-                'timestamp': detection['timestamp'].strftime('%Y-%m-%d %H:%M:%S'),
+                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(detection['timestamp'])),
                 'time_ago': self.get_time_ago(detection['timestamp'])
             })
         
         return formatted_detections
     
     def get_time_ago(self, timestamp):
-        """Get human-readable time ago"""
-        now = datetime.now()
-        diff = now - timestamp
+        """Get human-readable time ago for an epoch timestamp"""
+        seconds = int(time.time() - timestamp)
+        days = seconds // 86400
         
-        if diff.days > 0:
-            return f"{diff.days} day{'s' if diff.days != 1 else ''} ago"
-        elif diff.seconds > 3600:
-            hours = diff.seconds // 3600
+        if days > 0:
+            return f"{days} day{'s' if days != 1 else ''} ago"
+        elif seconds > 3600:
+            hours = seconds // 3600
             return f"{hours} hour{'s' if hours != 1 else ''} ago"
-        elif diff.seconds > 60:
-            minutes = diff.seconds // 60
+        elif seconds > 60:
+            minutes = seconds // 60
             return f"{minutes} minute{'s' if minutes != 1 else ''} ago"
         else:
             return "Just now"
@@ -1,9 +1,9 @@
 from flask import Blueprint, request, jsonify
 import logging
-from datetime import datetime, timedelta
-import json
+from datetime import datetime
 import os
-from utils.helpers import load_persons_from_db
+import numpy as np
+from utils.helpers import load_persons_from_db, load_persons_public, load_persons_with_matrix, count_recent_detections
 
 logger = logging.getLogger(__name__)
 
@@ -38,13 +38,8 @@ def health_check():
 def get_persons():
     """Get all registered persons"""
     try:
-        persons = load_persons_from_db(config.PERSONS_DB_FILE)
-        
-        # Remove embeddings from response to reduce payload size
-        for person_id in persons:
-            if 'embedding' in persons[person_id]:
-                del persons[person_id]['embedding']
-        
+        # Without embeddings to reduce payload size
+        persons = load_persons_public(config.PERSONS_DB_FILE)
         return jsonify(persons)
     except Exception as e:
         logger.error(f"Error getting persons: {e}")
@@ -100,25 +95,20 @@ def search_person():
                 pass
             return jsonify({'success': False, 'error': 'No face detected in the image'}), 400
         
-        # Search across all persons in database
-        persons = load_persons_from_db(config.PERSONS_DB_FILE)
+        # Search across all persons in database with one matrix-vector product
+        persons, person_ids, matrix, norms = load_persons_with_matrix(config.PERSONS_DB_FILE)
         matches = []
         
-        for person_id, person_info in persons.items():
-            if 'embedding' not in person_info:
-                continue
-            
-            similarity, confidence = face_matcher.compare_embeddings(
-                embedding, 
-                person_info['embedding']
-            )
-            
-            if similarity > config.FACE_RECOGNITION_THRESHOLD:
+        if person_ids:
+            similarities = face_matcher.compare_embeddings_batch(embedding, matrix, norms)
+            for idx in np.flatnonzero(similarities > config.FACE_RECOGNITION_THRESHOLD):
+                person_info = persons[person_ids[idx]]
+                similarity = float(similarities[idx])
                 matches.append({
-                    'person_id': person_id,
+                    'person_id': person_ids[idx],
                     'name': person_info.get('name', 'Unknown'),
                     'similarity': similarity,
-                    'confidence': confidence,
+                    'confidence': face_matcher.confidence_level(similarity),
                     'image_path': person_info.get('image_path'),
                     'last_seen': person_info.get('last_seen_location')
                 })
@@ -160,9 +150,7 @@ def get_system_stats():
         active_streams = 0
         if cctv_manager:
             try:
-                stream_status = cctv_manager.get_stream_status()
-                total_streams = len(stream_status)
-                active_streams = sum(1 for stream in stream_status.values() if stream.get('active', False))
+                total_streams, active_streams = cctv_manager.count_streams()
             except:
                 total_streams = 0
                 active_streams = 0
@@ -171,12 +159,7 @@ def get_system_stats():
         detections_today = 0
         if config and hasattr(config, 'DETECTIONS_DB_FILE'):
             try:
-                if os.path.exists(config.DETECTIONS_DB_FILE):
-                    with open(config.DETECTIONS_DB_FILE, 'r') as f:
-                        detections = json.load(f)
-                    cutoff_time = datetime.now() - timedelta(hours=24)
-                    detections_today = len([d for d in detections 
-                                          if datetime.fromisoformat(d['timestamp']) > cutoff_time])
+                detections_today = count_recent_detections(config.DETECTIONS_DB_FILE, hours=24)
             except:
                 detections_today = 0
         
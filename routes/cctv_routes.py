@@ -1,10 +1,12 @@
 from flask import Blueprint, render_template, request, jsonify
 import logging
 from datetime import datetime
-import cv2
 import os
-from utils.helpers import save_detection_to_db, load_persons_from_db
+from utils.helpers import save_detection_to_db, load_persons_from_db, load_persons_with_index
+from utils.cache import cache, DASHBOARD_KEY, STREAMS_KEY
 import json
+import threading
+import time
 import numpy as np
 
 logger = logging.getLogger(__name__)
@@ -22,12 +24,65 @@ def init_cctv_routes(app_config, cctv_manager_instance, face_matcher_instance):
     cctv_manager = cctv_manager_instance
     face_matcher = face_matcher_instance
 
+class DetectionWorker(threading.Thread):
+    """Matches a stream's detected faces against registered persons in the background
+    so frame requests only read the latest results. Stops once nobody has asked for
+    them for a while."""
+    
+    def __init__(self, stream_name):
+        super().__init__(daemon=True)
+        self.stream_name = stream_name
+        self.running = True
+        self.interval = 1.0 / getattr(config, 'DETECTION_FPS', 5)
+        self.idle_timeout = getattr(config, 'DETECTION_IDLE_SECONDS', 30)
+        self.last_requested = time.monotonic()
+        self._lock = threading.Lock()
+        self._detections = []
+    
+    def latest_detections(self):
+        """Detections from the most recent pass; also keeps the worker alive"""
+        self.last_requested = time.monotonic()
+        with self._lock:
+            return self._detections
+    
+    def run(self):
+        while self.running:
+            if (self.stream_name not in cctv_manager.active_streams
+                    or time.monotonic() - self.last_requested > self.idle_timeout):
+                break
+            started = time.monotonic()
+            detections = process_frame_for_detection(self.stream_name)
+            with self._lock:
+                self._detections = detections
+            time.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+        
+        self.running = False
+        with detection_workers_lock:
+            if detection_workers.get(self.stream_name) is self:
+                del detection_workers[self.stream_name]
+        logger.info(f"Detection worker for {self.stream_name} stopped")
+
+detection_workers = {}
+detection_workers_lock = threading.Lock()
+
+def get_detection_worker(stream_name):
+    """Return the running detection worker for a stream, starting one if needed"""
+    with detection_workers_lock:
+        worker = detection_workers.get(stream_name)
+        if worker is None or not worker.running:
+            worker = DetectionWorker(stream_name)
+            detection_workers[stream_name] = worker
+            worker.start()
+            logger.info(f"Detection worker for {stream_name} started")
+        return worker
+
 @cctv_bp.route('/management')
 def cctv_management():
     """Display CCTV management page"""
     return render_template('cctv_management.html')
 
 @cctv_bp.route('/dashboard')
+@cache.cached(key_prefix=DASHBOARD_KEY)
 def dashboard():
     """Display main dashboard"""
     try:
@@ -71,6 +126,7 @@ def add_cctv_stream():
         success = cctv_manager.add_stream(stream_name, rtsp_url, location)
         
         if success:
+            cache.delete_many(DASHBOARD_KEY, STREAMS_KEY)
             return jsonify({
                 'success': True,
                 'message': f'Stream {stream_name} added successfully'
@@ -86,6 +142,7 @@ def add_cctv_stream():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @cctv_bp.route('/streams')
+@cache.cached(key_prefix=STREAMS_KEY)
 def get_streams():
     """Get all CCTV streams status"""
     try:
@@ -110,16 +167,11 @@ def get_stream_frame(stream_name):
         if frame_base64:
             response_data['frame'] = frame_base64
             
-            # Always run face detection for webcam streams
+            # Always run face detection for webcam streams, optionally for others;
+            # detection runs in the stream's background worker, this only reads its results
             stream_info = cctv_manager.active_streams.get(stream_name, {})
-            if stream_info.get('url') == "0":  # Webcam stream
-                recent_detections = process_frame_for_detection(stream_name)
-                response_data['recent_detections'] = recent_detections
-            else:
-                # Optional: run detection for other streams if requested
-                if request.args.get('detect', 'false').lower() == 'true':
-                    recent_detections = process_frame_for_detection(stream_name)
-                    response_data['recent_detections'] = recent_detections
+            if stream_info.get('url') == "0" or request.args.get('detect', 'false').lower() == 'true':
+                response_data['recent_detections'] = get_detection_worker(stream_name).latest_detections()
         
         return jsonify(response_data)
         
@@ -145,6 +197,7 @@ def retry_stream(stream_name):
             stream_info['active'] = True
             stream_info['error_count'] = 0
             cctv_manager.start_stream_monitoring(stream_name)
+            cache.delete_many(DASHBOARD_KEY, STREAMS_KEY)
             return jsonify({'success': True, 'message': 'Stream reconnected'})
         else:
             return jsonify({'success': False, 'error': 'Failed to reconnect to stream'})
@@ -153,84 +206,79 @@ def retry_stream(stream_name):
         logger.error(f"Error retrying stream {stream_name}: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# stream_name -> (faces timestamp, detections) of the last processed detection pass
+_last_detection = {}
+
 def process_frame_for_detection(stream_name):
-    """Process frame to detect registered persons with visual feedback"""
+    """Match the faces the stream's monitor thread detected against registered persons.
+
+    Detection, overlay drawing and publishing all happen in CCTVManager's monitor
+    thread; this only scores the faces it found and hands the matches back as
+    overlays, so the frame is never run through the detector a second time.
+    """
     detections = []
+    overlays = []
     
     try:
         if not face_matcher or not config:
             return detections
-            
-        frame = cctv_manager.get_current_frame(stream_name, as_base64=False)
-        if frame is None:
+        
+        # Each detection pass is matched once; unchanged scenes keep their timestamp
+        # (see the dHash skip in CCTVManager._detect_faces)
+        faces_timestamp, faces = cctv_manager.get_detected_faces(stream_name)
+        if faces_timestamp is None:
             return detections
+        # The monitor runs every available detector, so one person can appear once per
+        # algorithm; match only InsightFace's faces to get one detection per face
+        faces = [face for face in faces if face.get('algorithm') == 'insightface']
+        last = _last_detection.get(stream_name)
+        if last is not None and last[0] == faces_timestamp:
+            return last[1]
         
-        # Load registered persons
-        persons = load_persons_from_db(config.PERSONS_DB_FILE)
+        # Load registered persons and their face index (cached until the DB changes)
+        persons, face_index = load_persons_with_index(config.PERSONS_DB_FILE)
         
-        # Extract faces from current frame
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        faces = face_matcher.insight_app.get(rgb_frame)
+        # Find the best registered person for every face
+        best_ids, best_similarities = [], []
+        if faces and len(face_index):
+            best_ids, best_similarities = face_index.search(
+                np.stack([face['embedding'] for face in faces]),
+                lambda queries, matrix, norms: face_matcher.compare_embeddings_batch(
+                    {'insightface': queries}, matrix, norms)
+            )
         
-        # Draw face detection results on frame
-        for face in faces:
-            # Draw face bounding box
-            bbox = face.bbox.astype(int)
-            cv2.rectangle(frame, (bbox[0], bbox[1]), (bbox[2], bbox[3]), (0, 255, 0), 2)
+        for i, face in enumerate(faces):
+            if not best_ids:
+                break
+            similarity = float(best_similarities[i])
+            if similarity <= config.FACE_RECOGNITION_THRESHOLD:
+                continue
             
-            # Check against registered persons
-            person_detected = False
-            for person_id, person_info in persons.items():
-                if 'embedding' not in person_info:
-                    continue
-                
-                target_embedding = person_info['embedding']
-                similarity, confidence = face_matcher.compare_embeddings(
-                    target_embedding, 
-                    {'insightface': face.embedding}
-                )
-                
-                if similarity > config.FACE_RECOGNITION_THRESHOLD:
-                    # Person matched!
-                    detection = {
-                        'person_id': person_id,
-                        'person_name': person_info.get('name', 'Unknown'),
-                        'confidence': similarity,
-                        'location': stream_name,
-                        'bbox': bbox.tolist(),
-                        'stream_name': stream_name
-                    }
-                    
-                    detections.append(detection)
-                    
-                    # Draw recognition info on frame
-                    label = f"{person_info['name']} ({similarity*100:.1f}%)"
-                    cv2.putText(frame, label, (bbox[0], bbox[1]-10), 
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
-                    
-                    # Save detection to database
-                    save_detection_to_db(detection, config.DETECTIONS_DB_FILE)
-                    
-                    logger.info(f"Detection: {person_info['name']} at {stream_name} "
-                               f"with {similarity*100:.1f}% confidence")
-                    person_detected = True
-                    break
+            # Person matched!
+            person_id = best_ids[i]
+            person_info = persons[person_id]
+            x1, y1, x2, y2 = face['bbox']
+            detection = {
+                'person_id': person_id,
+                'person_name': person_info.get('name', 'Unknown'),
+                'confidence': similarity,
+                'location': stream_name,
+                'bbox': [x1, y1, x2, y2],
+                'stream_name': stream_name
+            }
+            detections.append(detection)
+            overlays.append((x1, y1, x2, y2, detection['person_name'], similarity, True))
             
-            # If no person matched, show "Unknown Person"
-            if not person_detected:
-                cv2.putText(frame, "Unknown Person", (bbox[0], bbox[1]-10), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
-        
-        # Update the frame in the stream with detection boxes
-        if len(faces) > 0:
-            # Convert back to BGR and update the frame
-            frame_bgr = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-            if not cctv_manager.frame_queues[stream_name].empty():
-                try:
-                    cctv_manager.frame_queues[stream_name].get_nowait()
-                except:
-                    pass
-            cctv_manager.frame_queues[stream_name].put(frame_bgr)
+            # Save detection to database
+            save_detection_to_db(detection, config.DETECTIONS_DB_FILE)
+            
+            logger.info(f"Detection: {person_info['name']} at {stream_name} "
+                       f"with {similarity*100:.1f}% confidence")
+        
+        _last_detection[stream_name] = (faces_timestamp, detections)
+        
+        # Drawn by the monitor thread in its own overlay style
+        cctv_manager.set_extra_overlays(stream_name, faces_timestamp, overlays)
         
         return detections
         
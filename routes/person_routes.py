@@ -2,6 +2,7 @@ from flask import Blueprint, render_template, request, jsonify
 import logging
 import os
 from utils.helpers import save_person_to_db, load_persons_from_db, save_uploaded_file, allowed_file
+from utils.cache import cache, PERSON_LIST_KEY, DASHBOARD_KEY
 
 logger = logging.getLogger(__name__)
 
@@ -126,6 +127,7 @@ def upload_person():
         person_id = save_person_to_db(person_data, app_config.PERSONS_DB_FILE)
         
         if person_id:
+            cache.delete_many(PERSON_LIST_KEY, DASHBOARD_KEY)
             logger.info(f"Successfully registered person: {person_data['name']} with ID: {person_id}")
             return jsonify({
                 'success': True,
@@ -140,6 +142,7 @@ def upload_person():
         return jsonify({'success': False, 'error': f'Internal server error: {str(e)}'}), 500
 
 @person_bp.route('/list')
+@cache.cached(key_prefix=PERSON_LIST_KEY)
 def list_persons():
     """Display list of all registered persons"""
     try:
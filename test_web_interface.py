@@ -1,5 +1,22 @@
 # test_http_streams.py
 import cv2
+from concurrent.futures import ThreadPoolExecutor
+
+def _probe(url):
+    """Return `url` if it delivers a frame, otherwise None"""
+    print(f"Testing: {url}")
+    try:
+        cap = cv2.VideoCapture(url)
+        if cap.isOpened():
+            ret, frame = cap.read()
+            if ret and frame is not None:
+                print(f"✅ SUCCESS! HTTP stream: {url}")
+                cap.release()
+                return url
+        cap.release()
+    except Exception as e:
+        print(f"❌ Error: {e}")
+    return None
 
 def test_http_streams():
     http_urls = [
@@ -21,21 +38,11 @@ def test_http_streams():
         "http://10.21.96.111:8080/cam",
     ]
     
-    for url in http_urls:
-        print(f"Testing: {url}")
-        try:
-            cap = cv2.VideoCapture(url)
-            if cap.isOpened():
-                ret, frame = cap.read()
-                if ret and frame is not None:
-                    print(f"✅ SUCCESS! HTTP stream: {url}")
-                    cap.release()
-                    return url
-            cap.release()
-        except Exception as e:
-            print(f"❌ Error: {e}")
+    # Probe all URLs concurrently; the first working one in list order wins
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        results = list(executor.map(_probe, http_urls))
     
-    return None
+    return next((url for url in results if url is not None), None)
 
 if __name__ == "__main__":
     print("Testing HTTP streaming...")
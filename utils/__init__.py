@@ -1,4 +1,6 @@
-from .helpers import save_person_to_db, load_persons_from_db, save_detection_to_db
-from .augmentations import get_augmentations
+from .helpers import save_person_to_db, load_persons_from_db, save_detection_to_db, build_embedding_matrix
+from .face_index import FaceIndex
+from .augmentations import get_augmentations, get_augmentations_serve
 
-__all__ = ['save_person_to_db', 'load_persons_from_db', 'save_detection_to_db', 'get_augmentations']
\ No newline at end of file
+__all__ = ['save_person_to_db', 'load_persons_from_db', 'save_detection_to_db', 'build_embedding_matrix',
+           'FaceIndex', 'get_augmentations', 'get_augmentations_serve']
\ No newline at end of file
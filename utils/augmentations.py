@@ -2,9 +2,8 @@ import albumentations as A
 import cv2
 import numpy as np
 
-def get_augmentations():
-    """Get data augmentation pipeline for better face matching"""
-    return A.Compose([
+# Pipelines are built once at import and shared; Compose objects are reusable
+_TRAIN = A.Compose([
         # Geometric transformations
         A.HorizontalFlip(p=0.3),
         A.Rotate(limit=15, p=0.2),
@@ -31,6 +30,21 @@ def get_augmentations():
         A.ImageCompression(quality_lower=60, quality_upper=90, p=0.2),
     ])
 
+# Serving path: cheap photometric tweaks only, no procedural weather effects or blur
+_SERVE = A.Compose([
+    A.HorizontalFlip(p=0.3),
+    A.RandomBrightnessContrast(brightness_limit=0.2, contrast_limit=0.2, p=0.3),
+    A.CLAHE(clip_limit=2.0, p=0.2),
+])
+
+def get_augmentations():
+    """Get data augmentation pipeline for better face matching (training)"""
+    return _TRAIN
+
+def get_augmentations_serve():
+    """Get the lightweight augmentation pipeline used at serving time"""
+    return _SERVE
+
 def apply_augmentations(image, augmentations):
     """Apply augmentations to image"""
     if augmentations is None:
@@ -0,0 +1,32 @@
+import logging
+
+# Flask-Caching is optional; without it views are simply not cached
+try:
+    from flask_caching import Cache
+    FLASK_CACHING_AVAILABLE = True
+except ImportError:
+    FLASK_CACHING_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Cache keys of the cached views, used to invalidate them when their data changes
+PERSON_LIST_KEY = 'view_person_list'
+DASHBOARD_KEY = 'view_dashboard'
+STREAMS_KEY = 'view_streams'
+
+class _NullCache:
+    """Stand-in with the parts of the Cache API used here, for when Flask-Caching
+    is not installed"""
+    def init_app(self, app, config=None):
+        logger.info("Flask-Caching not installed, view caching disabled")
+    
+    def cached(self, *args, **kwargs):
+        return lambda view: view
+    
+    def delete(self, *keys):
+        pass
+    
+    def delete_many(self, *keys):
+        pass
+
+cache = Cache() if FLASK_CACHING_AVAILABLE else _NullCache()
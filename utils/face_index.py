@@ -0,0 +1,83 @@
+import logging
+import numpy as np
+
+# FAISS is optional; without it every query is scored against all persons
+try:
+    import faiss
+    FAISS_AVAILABLE = True
+except ImportError:
+    FAISS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Without FAISS, indexes over at least this many persons shortlist candidates in a
+# PREFILTER_DIMS-dimensional projection before the exact full-dimension re-score
+PREFILTER_MIN_PERSONS = 1024
+PREFILTER_DIMS = 64
+
+class FaceIndex:
+    """Nearest-person lookup over the registered InsightFace embeddings.
+
+    FAISS (inner product over L2-normalized rows, i.e. cosine) only shortlists the
+    `candidates` most similar persons per query; the shortlist is then re-scored
+    with the caller's exact metric, so results match an exhaustive scan whenever
+    the best person is within the shortlist. Without FAISS, large indexes shortlist
+    by cosine in a 64-dimensional projection onto the rows' principal directions.
+    """
+
+    def __init__(self, person_ids, matrix, norms, candidates=16):
+        self.person_ids = person_ids
+        self.matrix = matrix
+        self.norms = norms
+        self.candidates = candidates
+        self.index = None
+        self.projection = None
+
+        if FAISS_AVAILABLE and len(person_ids) > candidates:
+            unit = np.ascontiguousarray(matrix / norms[:, None], dtype=np.float32)
+            self.index = faiss.IndexFlatIP(unit.shape[1])
+            self.index.add(unit)
+        elif len(person_ids) >= PREFILTER_MIN_PERSONS and matrix.shape[1] > PREFILTER_DIMS:
+            # Uncentered PCA: the top eigenvectors of U^T U keep inner products between
+            # unit rows (not just their variance), which is what the shortlist ranks by
+            unit = matrix / norms[:, None]
+            _, eigenvectors = np.linalg.eigh(unit.T @ unit)
+            self.projection = np.ascontiguousarray(eigenvectors[:, -PREFILTER_DIMS:], dtype=np.float32)
+            self.projected = np.ascontiguousarray(unit @ self.projection, dtype=np.float32)
+            # The projection is lossier than FAISS's exact cosine, so keep more candidates
+            self.prefilter_candidates = min(len(person_ids), 4 * candidates)
+
+    def __len__(self):
+        return len(self.person_ids)
+
+    def search(self, queries, scorer):
+        """Best person for each row of `queries` (F, D).
+
+        `scorer(queries, matrix, norms)` must return (F, N) similarity scores.
+        Returns (person_ids, scores) with one entry per query.
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        if not self.person_ids or len(queries) == 0:
+            return [], np.zeros(0, dtype=np.float32)
+
+        if self.index is None and self.projection is None:
+            similarities = scorer(queries, self.matrix, self.norms)
+            best = similarities.argmax(axis=1)
+            return [self.person_ids[i] for i in best], similarities[np.arange(len(queries)), best]
+
+        unit = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+        if self.index is not None:
+            _, shortlist = self.index.search(np.ascontiguousarray(unit, dtype=np.float32), self.candidates)
+        else:
+            prelim = (unit @ self.projection) @ self.projected.T
+            k = self.prefilter_candidates
+            shortlist = np.argpartition(-prelim, k - 1, axis=1)[:, :k]
+
+        best_ids, best_scores = [], np.empty(len(queries), dtype=np.float32)
+        for i, rows in enumerate(shortlist):
+            rows = rows[rows >= 0]
+            similarities = scorer(queries[i], self.matrix[rows], self.norms[rows])
+            best = int(similarities.argmax())
+            best_ids.append(self.person_ids[rows[best]])
+            best_scores[i] = similarities[best]
+        return best_ids, best_scores
@@ -1,9 +1,23 @@
+import base64
+import bisect
 import json
 import os
+import queue
+import shutil
+import threading
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 import logging
 import numpy as np
+from flask.json.provider import DefaultJSONProvider
+from utils.face_index import FaceIndex
+
+# Try to import optional fast JSON encoder
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
 
 logger = logging.getLogger(__name__)
 
@@ -18,55 +32,194 @@ class NumpyEncoder(json.JSONEncoder):
             return float(obj)
         return super().default(obj)
 
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes responses with orjson (NumPy arrays
+    natively), falling back to the default encoder for anything else. Output
+    matches the default provider: keys are sorted (per `sort_keys`) and dates are
+    passed through Flask's `default`, which formats them as HTTP dates."""
+    
+    @property
+    def option(self):
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return option
+    
+    def dumps(self, obj, **kwargs):
+        try:
+            return orjson.dumps(obj, default=self.default, option=self.option).decode()
+        except TypeError:
+            return super().dumps(obj, **kwargs)
+    
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        try:
+            data = orjson.dumps(obj, default=self.default, option=self.option)
+        except TypeError:
+            data = super().dumps(obj)
+        return self._app.response_class(data, mimetype=self.mimetype)
+
+def _read_json(path):
+    """Parse a JSON file, with orjson when available (its decode error subclasses
+    json.JSONDecodeError, so callers handle both the same way)"""
+    if ORJSON_AVAILABLE:
+        with open(path, 'rb') as f:
+            return orjson.loads(f.read())
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def _write_json_atomic(path, data, indent=False):
+    """Write JSON to a temp file and swap it in, so readers never see a partial file;
+    compact unless `indent`, NumPy values are converted by either encoder"""
+    tmp_path = f"{path}.tmp"
+    encoded = None
+    if ORJSON_AVAILABLE:
+        try:
+            encoded = orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY
+                                   | (orjson.OPT_INDENT_2 if indent else 0))
+        except TypeError:
+            pass  # e.g. non-contiguous arrays; the stdlib encoder handles those
+    if encoded is None:
+        encoded = json.dumps(data, cls=NumpyEncoder, indent=2 if indent else None,
+                             separators=None if indent else (',', ':')).encode()
+    with open(tmp_path, 'wb') as f:
+        f.write(encoded)
+    os.replace(tmp_path, path)
+
+def _pack_embedding(embedding):
+    """Encode an embedding as base64 float16 bytes for the persons DB file"""
+    return base64.b64encode(np.asarray(embedding, dtype='<f2').tobytes()).decode('ascii')
+
+def _unpack_embedding(packed):
+    """Decode a stored embedding to float32; accepts packed strings and plain lists"""
+    if isinstance(packed, str):
+        return np.frombuffer(base64.b64decode(packed), dtype='<f2').astype(np.float32)
+    return np.asarray(packed, dtype=np.float32)
+
+def _packed_persons(persons):
+    """Copy of `persons` with every InsightFace embedding packed for writing"""
+    packed = {}
+    for person_id, person_data in persons.items():
+        embedding_data = person_data.get('embedding')
+        if embedding_data and embedding_data.get('insightface') is not None:
+            person_data = dict(person_data)
+            person_data['embedding'] = dict(embedding_data)
+            person_data['embedding']['insightface'] = _pack_embedding(embedding_data['insightface'])
+        packed[person_id] = person_data
+    return packed
+
+# Serializes read-modify-write of the persons DB between concurrent registrations
+_persons_write_lock = threading.Lock()
+
 def save_person_to_db(person_data, db_file):
     """Save person data to JSON database with NumPy support"""
     try:
-        # Load existing data
-        try:
-            with open(db_file, 'r') as f:
-                persons = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            persons = {}
-        
-        # Generate unique ID
-        person_id = str(uuid.uuid4())
-        person_data['id'] = person_id
-        person_data['created_at'] = datetime.now().isoformat()
-        
-        # Convert NumPy arrays to lists for JSON serialization
-        if 'embedding' in person_data and person_data['embedding'] is not None:
-            embedding_data = person_data['embedding']
-            if 'insightface' in embedding_data and isinstance(embedding_data['insightface'], np.ndarray):
-                embedding_data['insightface'] = embedding_data['insightface'].tolist()
-        
-        # Save to database with custom encoder
-        persons[person_id] = person_data
-        
-        with open(db_file, 'w') as f:
-            json.dump(persons, f, indent=2, cls=NumpyEncoder)
-        
-        logger.info(f"Saved person {person_data['name']} to database")
-        return person_id
-        
+        with _persons_write_lock:
+            return _save_person(person_data, db_file)
     except Exception as e:
         logger.error(f"Error saving person to database: {e}")
         return None
 
+def _save_person(person_data, db_file):
+    """Add one person to the persons DB file; caller holds _persons_write_lock"""
+    # Start from the cached parse instead of re-reading the file; shallow copy so
+    # the cached dict other requests are using isn't modified
+    entry = _load_persons_cached(db_file)
+    if entry.get('unreadable'):
+        # Writing now would replace every stored person with this one
+        raise RuntimeError(f"Persons database {db_file} could not be read; not overwriting it")
+    persons = dict(entry['persons'])
+    
+    # Generate unique ID
+    person_id = str(uuid.uuid4())
+    person_data['id'] = person_id
+    person_data['created_at'] = datetime.now().isoformat()
+    
+    # Save to database with custom encoder; compact, with embeddings stored as base64
+    # float16 (~1.4 KB per person instead of ~10 KB of decimal text)
+    persons[person_id] = person_data
+    _write_json_atomic(db_file, _packed_persons(persons))
+    
+    logger.info(f"Saved person {person_data['name']} to database")
+    return person_id
+
+# Parsed persons DB and the views derived from it, reused until the file's mtime or
+# size changes; (key, entry) is swapped as one tuple so readers never mix versions
+_persons_cache = (None, None)
+
+def _load_persons_cached(db_file):
+    """Return the cache entry for `db_file`, re-parsing it only when it changed"""
+    global _persons_cache
+    try:
+        stat = os.stat(db_file)
+    except OSError:
+        matrix = build_embedding_matrix({})
+        return {'persons': {}, 'public': {}, 'matrix': matrix, 'index': FaceIndex(*matrix)}
+    
+    key = (db_file, stat.st_mtime_ns, stat.st_size)
+    cached_key, entry = _persons_cache
+    if cached_key != key:
+        persons = _read_persons_file(db_file)
+        if persons is None:
+            # Failed parse: serve an empty view but don't cache it, so the next call
+            # retries and saves can tell the file apart from an empty database
+            matrix = build_embedding_matrix({})
+            return {'persons': {}, 'public': {}, 'matrix': matrix, 'index': FaceIndex(*matrix),
+                    'unreadable': True}
+        matrix = build_embedding_matrix(persons)
+        entry = {
+            'persons': persons,
+            # Listing view without embeddings
+            'public': {
+                person_id: {k: v for k, v in person_data.items() if k != 'embedding'}
+                for person_id, person_data in persons.items()
+            },
+            # Match table for per-frame detection and search
+            'matrix': matrix,
+            # Nearest-person index for per-frame detection, rebuilt with the file
+            'index': FaceIndex(*matrix),
+        }
+        _persons_cache = (key, entry)
+    return entry
+
 def load_persons_from_db(db_file):
-    """Load all persons from database"""
+    """Load all persons from database. The result is cached and shared between
+    callers, so treat it as read-only"""
+    return _load_persons_cached(db_file)['persons']
+
+def load_persons_public(db_file):
+    """Load all persons without their embeddings (read-only, cached)"""
+    return _load_persons_cached(db_file)['public']
+
+def load_persons_with_matrix(db_file):
+    """Load (persons, person_ids, matrix, norms) from one version of the database;
+    see build_embedding_matrix (read-only, cached)"""
+    entry = _load_persons_cached(db_file)
+    return (entry['persons'], *entry['matrix'])
+
+def load_persons_with_index(db_file):
+    """Load (persons, face_index) from one version of the database (read-only, cached)"""
+    entry = _load_persons_cached(db_file)
+    return entry['persons'], entry['index']
+
+def _read_persons_file(db_file):
+    """Parse the persons JSON file; None if it exists but could not be loaded"""
     try:
         if not os.path.exists(db_file):
             return {}
             
-        with open(db_file, 'r') as f:
-            persons = json.load(f)
+        persons = _read_json(db_file)
             
-        # Convert embedding lists back to NumPy arrays when loading
+        # Convert stored embeddings back to float32 NumPy arrays (InsightFace's dtype) when loading
         for person_id, person_data in persons.items():
             if 'embedding' in person_data and person_data['embedding'] is not None:
                 embedding_data = person_data['embedding']
-                if 'insightface' in embedding_data and isinstance(embedding_data['insightface'], list):
-                    embedding_data['insightface'] = np.array(embedding_data['insightface'])
+                if isinstance(embedding_data.get('insightface'), (str, list)):
+                    vector = _unpack_embedding(embedding_data['insightface'])
+                    embedding_data['insightface'] = vector
+                    # Norm of the vector as stored, so compare_embeddings never recomputes it
+                    # and stays consistent with the float16 round-trip
+                    embedding_data['norm'] = float(np.linalg.norm(vector))
                     
         return persons
     except FileNotFoundError:
@@ -82,42 +235,120 @@ def load_persons_from_db(db_file):
             return {}
     except Exception as e:
         logger.error(f"Error loading persons from database: {e}")
-        return {}
+        return None
+
+def build_embedding_matrix(persons):
+    """Stack the InsightFace embeddings of all persons into one float32 matrix.
+
+    Returns (person_ids, matrix, norms) where row i of `matrix` belongs to
+    person_ids[i] and norms[i] is its L2 norm.
+    """
+    person_ids = []
+    vectors = []
+    for person_id, person_info in persons.items():
+        embedding = person_info.get('embedding')
+        if embedding and embedding.get('insightface') is not None:
+            person_ids.append(person_id)
+            vectors.append(embedding['insightface'])
+    
+    if not vectors:
+        return [], np.zeros((0, 0), dtype=np.float32), np.zeros(0, dtype=np.float32)
+    
+    matrix = np.ascontiguousarray(vectors, dtype=np.float32)
+    return person_ids, matrix, np.linalg.norm(matrix, axis=1)
+
+# Detections are written by one background thread so request threads never block on
+# the read-modify-write of the JSON file; bursts are written in a single pass
+_detection_queue = queue.Queue()
+_detection_writer = None
+_detection_writer_lock = threading.Lock()
 
 def save_detection_to_db(detection_data, db_file):
-    """Save detection to database"""
+    """Queue a detection to be saved to the database"""
+    global _detection_writer
+    try:
+        detection_data['id'] = str(uuid.uuid4())
+        detection_data['timestamp'] = datetime.now().isoformat()
+        
+        with _detection_writer_lock:
+            if _detection_writer is None:
+                _detection_writer = threading.Thread(target=_detection_writer_loop, daemon=True)
+                _detection_writer.start()
+        _detection_queue.put((db_file, detection_data))
+        return True
+        
+    except Exception as e:
+        logger.error(f"Error saving detection to database: {e}")
+        return False
+
+def _detection_writer_loop():
+    """Drain queued detections and append them to their database files"""
+    while True:
+        pending = {}
+        db_file, detection_data = _detection_queue.get()
+        pending.setdefault(db_file, []).append(detection_data)
+        while True:
+            try:
+                db_file, detection_data = _detection_queue.get_nowait()
+            except queue.Empty:
+                break
+            pending.setdefault(db_file, []).append(detection_data)
+        
+        for db_file, new_detections in pending.items():
+            _write_detections(db_file, new_detections)
+
+def _write_detections(db_file, new_detections):
+    """Append detections to the JSON database file"""
     try:
         # Load existing detections
         try:
-            with open(db_file, 'r') as f:
-                detections = json.load(f)
+            detections = _read_json(db_file)
         except (FileNotFoundError, json.JSONDecodeError):
             detections = []
         
-        # Add new detection
-        detection_data['id'] = str(uuid.uuid4())
-        detection_data['timestamp'] = datetime.now().isoformat()
-        detections.append(detection_data)
+        detections.extend(new_detections)
         
         # Keep only last 1000 detections to prevent file from growing too large
         if len(detections) > 1000:
             detections = detections[-1000:]
         
-        with open(db_file, 'w') as f:
-            json.dump(detections, f, indent=2, cls=NumpyEncoder)
+        _write_json_atomic(db_file, detections, indent=True)
         
-        logger.info(f"Saved detection for {detection_data.get('person_name', 'Unknown')}")
-        return True
+        for detection_data in new_detections:
+            logger.info(f"Saved detection for {detection_data.get('person_name', 'Unknown')}")
         
     except Exception as e:
         logger.error(f"Error saving detection to database: {e}")
-        return False
 
-def allowed_file(filename, allowed_extensions=None):
-    """Check if file extension is allowed"""
-    if allowed_extensions is None:
-        allowed_extensions = {'png', 'jpg', 'jpeg', 'gif'}
+# Timestamps of the detections file, re-read only when the file changes
+_detection_timestamps_cache = {'path': None, 'mtime': None, 'timestamps': []}
+
+def count_recent_detections(db_file, hours=24):
+    """Count detections saved in the last `hours` hours"""
+    try:
+        mtime = os.path.getmtime(db_file)
+    except OSError:
+        return 0
+    
+    cache = _detection_timestamps_cache
+    if cache['path'] != db_file or cache['mtime'] != mtime:
+        detections = _read_json(db_file)
+        # Detections are appended in time order, so the ISO strings are already sorted
+        cache['timestamps'] = [d['timestamp'] for d in detections]
+        cache['path'], cache['mtime'] = db_file, mtime
     
+    # ISO-8601 strings compare chronologically, so no per-record datetime parsing
+    cutoff = (datetime.now() - timedelta(hours=hours)).isoformat()
+    timestamps = cache['timestamps']
+    return len(timestamps) - bisect.bisect_right(timestamps, cutoff)
+
+ALLOWED_EXTENSIONS = frozenset(('png', 'jpg', 'jpeg', 'gif'))
+
+# Upload directories already created by this process
+_ensured_dirs = set()
+
+def allowed_file(filename, allowed_extensions=ALLOWED_EXTENSIONS):
+    """Check if file extension is allowed"""
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in allowed_extensions
 
@@ -131,11 +362,15 @@ def save_uploaded_file(file, upload_folder, subfolder=''):
         filename = f"{uuid.uuid4()}_{file.filename}"
         filepath = os.path.join(upload_folder, subfolder, filename)
         
-        # Ensure directory exists
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        # Ensure directory exists (once per directory)
+        directory = os.path.dirname(filepath)
+        if directory not in _ensured_dirs:
+            os.makedirs(directory, exist_ok=True)
+            _ensured_dirs.add(directory)
         
-        # Save file
-        file.save(filepath)
+        # Stream the upload to disk in 1 MiB chunks
+        with open(filepath, 'wb') as dst:
+            shutil.copyfileobj(file.stream, dst, length=1024 * 1024)
         
         return filepath, None
         
@@ -0,0 +1,12 @@
+"""WSGI entry point for running the app under gunicorn.
+
+    gunicorn -w 1 -k gthread --threads 64 -b 0.0.0.0:8001 --timeout 0 wsgi:app
+
+Use a single worker: the CCTV manager, its capture threads and the face
+matcher live in-process, so extra workers would each open every camera.
+Threads (not gevent) are used because OpenCV capture/encode calls block in C
+code, which would stall a gevent hub for every connected client.
+"""
+from app import create_app
+
+app = create_app('production')